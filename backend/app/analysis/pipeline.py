@@ -1,15 +1,22 @@
 from __future__ import annotations
 
 import logging
+import os
+import re
+import shutil
 import tempfile
 import traceback
 from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import librosa
 
 from app.analysis.models import (
     AnalysisResult,
     Bar,
     BarInstruments,
     Beat,
+    BeatCell,
     InstrumentBeat,
     InstrumentGrid,
     Metadata,
@@ -19,13 +26,16 @@ from app.jobs.models import JobStatus
 
 logger = logging.getLogger(__name__)
 
+BACHATA_KEYWORDS = re.compile(r"\b(?:bachata|romeo santos|aventura|prince royce)\b", re.IGNORECASE)
+SALSA_KEYWORDS = re.compile(r"\b(?:salsa|timba|son|mambo)\b", re.IGNORECASE)
+
 
+@lru_cache(maxsize=256)
 def guess_genre(title: str) -> GenreHint:
     """Guess genre from title keywords."""
-    title_lower = title.lower()
-    if any(w in title_lower for w in ["bachata", "romeo santos", "aventura", "prince royce"]):
+    if BACHATA_KEYWORDS.search(title):
         return GenreHint.BACHATA
-    if any(w in title_lower for w in ["salsa", "timba", "son", "mambo"]):
+    if SALSA_KEYWORDS.search(title):
         return GenreHint.SALSA
     return GenreHint.BACHATA
 
@@ -44,6 +54,17 @@ class AnalysisPipeline:
         self._beat_detector = beat_detector
         self._instrument_analyzer = instrument_analyzer
         self._job_repo = job_repository
+        # Shared across jobs so threads are not spawned and torn down per run
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(4, os.cpu_count() or 1),
+            thread_name_prefix="pipeline",
+        )
+
+    def close(self) -> None:
+        """Shut down the pipeline's worker pool and those of its stages."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._beat_detector.close()
+        self._instrument_analyzer.close()
 
     def run(self, job_id: str) -> None:
         """Run the full analysis pipeline for a job."""
@@ -56,7 +77,6 @@ class AnalysisPipeline:
             self._job_repo.update_status(job_id, JobStatus.DOWNLOADING, 0.05)
             cached_audio = self._job_repo.get_audio_cache(job.video_id) if job.video_id else None
             if cached_audio:
-                import os
                 audio_path, title, duration = cached_audio
                 if not os.path.exists(audio_path):
                     cached_audio = None
@@ -76,22 +96,56 @@ class AnalysisPipeline:
             # Stages 2-3: Beat detection + source separation (parallel)
             self._job_repo.update_status(job_id, JobStatus.SEPARATING_STEMS, 0.15)
 
-            with ThreadPoolExecutor(max_workers=2) as pool:
-                beat_future = pool.submit(self._beat_detector.detect, audio_path)
-                stem_future = pool.submit(self._separator.separate, audio_path)
-
-                beat_result = beat_future.result()
-                beats_raw = [{"time": b.time, "beat_num": b.beat_num} for b in beat_result.beats]
-                bars_raw = [{"start": b.start, "end": b.end, "bar_num": b.bar_num} for b in beat_result.bars]
-                tempo = beat_result.tempo
-
+            # Stems depend only on the audio, so re-running a song (e.g.
+            # with another genre) reuses the previous separation
+            cached_stems = self._job_repo.get_stems_cache(job.video_id) if job.video_id else None
+            if cached_stems and not os.path.isdir(cached_stems):
+                cached_stems = None
+
+            # The separator reads the file itself and the beat detector works
+            # on one shared decode. Both stay on threads: Demucs runs
+            # in-process and torch releases the GIL inside its ops, so the
+            # stages still overlap without pickling the audio or loading the
+            # models again in worker processes.
+            stem_future = None
+            if not cached_stems:
+                # Stems go next to the song's audio, in a directory of this
+                # job's own: another genre of the same song may be separating
+                # concurrently, and the stems cache is only set once a run
+                # has finished writing
+                stems_out = tempfile.mkdtemp(prefix="stems_", dir=os.path.dirname(audio_path))
+                stem_future = self._pool.submit(self._separator.separate, audio_path, stems_out)
+
+            # Decode while separation is already running
+            y, sr = librosa.load(audio_path, sr=None, mono=True)
+            beat_future = self._pool.submit(self._beat_detector.detect_from_array, y, sr)
+            beat_result = beat_future.result()
+            # Nothing else reads the decoded song; free it before waiting on
+            # separation and running instrument analysis
+            del y
+            beats_raw = [{"time": b.time, "beat_num": b.beat_num} for b in beat_result.beats]
+            bars_raw = [{"start": b.start, "end": b.end, "bar_num": b.bar_num} for b in beat_result.bars]
+            tempo = beat_result.tempo
+
+            stems_dir = cached_stems
+            if stem_future is not None:
                 try:
-                    sep_result = stem_future.result()
-                    stems_dir = sep_result.stems_dir
-                    job.stems_dir = stems_dir
+                    stems_dir = stem_future.result().stems_dir
                 except Exception as e:
+                    shutil.rmtree(stems_out, ignore_errors=True)
                     logger.warning(f"Source separation failed, continuing without stems: {e}")
-                    stems_dir = None
+                else:
+                    # Another genre of the song may have finished separating
+                    # first; keep its stems and drop this run's copy
+                    current = self._job_repo.get_stems_cache(job.video_id) if job.video_id else None
+                    if current and current != stems_dir and os.path.isdir(current):
+                        shutil.rmtree(stems_out, ignore_errors=True)
+                        stems_dir = current
+                    elif job.video_id:
+                        self._job_repo.set_stems_cache(job.video_id, stems_dir)
+
+            if stems_dir:
+                job.stems_dir = stems_dir
 
             # Stage 4: Beat-by-beat instrument analysis
             self._job_repo.update_status(job_id, JobStatus.ANALYZING_INSTRUMENTS, 0.75)
@@ -99,25 +153,33 @@ class AnalysisPipeline:
                 genre.value, bars_raw, beats_raw, stems_dir, tempo
             )
 
-            # Build result
-            instrument_grid = InstrumentGrid(
+            # Build result. Everything here was produced by our own stages,
+            # so skip pydantic validation.
+            instrument_grid = InstrumentGrid.model_construct(
                 genre=grid_raw["genre"],
                 instrument_list=grid_raw["instrument_list"],
                 subdivisions=grid_raw.get("subdivisions", 16),
                 bars=[
-                    BarInstruments(
+                    BarInstruments.model_construct(
                         bar_num=b["bar_num"],
-                        instruments=[InstrumentBeat(**ib) for ib in b["instruments"]],
+                        instruments=[
+                            InstrumentBeat.model_construct(
+                                instrument=ib["instrument"],
+                                beats=[BeatCell.model_construct(**cell) for cell in ib["beats"]],
+                                confidence=ib["confidence"],
+                            )
+                            for ib in b["instruments"]
+                        ],
                     )
                     for b in grid_raw["bars"]
                 ],
             )
 
-            result = AnalysisResult(
-                metadata=Metadata(title=title, duration=duration, genre_hint=genre),
+            result = AnalysisResult.model_construct(
+                metadata=Metadata.model_construct(title=title, duration=duration, genre_hint=genre),
                 tempo=tempo,
-                beats=[Beat(**b) for b in beats_raw],
-                bars=[Bar(**b) for b in bars_raw],
+                beats=[Beat.model_construct(**b) for b in beats_raw],
+                bars=[Bar.model_construct(**b) for b in bars_raw],
                 instrument_grid=instrument_grid,
             )
 
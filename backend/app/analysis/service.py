@@ -3,29 +3,46 @@ from __future__ import annotations
 import re
 import threading
 import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 
 from app.analysis.pipeline import AnalysisPipeline
 from app.jobs.models import JobStatus
 
-VIDEO_ID_PATTERNS = [
-    re.compile(r"(?:v=|/v/|youtu\.be/)([a-zA-Z0-9_-]{11})"),
-]
+VIDEO_ID_PATTERN = re.compile(r"(?:v=|/v/|youtu\.be/|shorts/)([a-zA-Z0-9_-]{11})")
 
 MAX_CONCURRENT_JOBS = 2
+QUEUE_DEPTH = 4
 
 
+@lru_cache(maxsize=2048)
 def extract_video_id(url: str) -> str | None:
-    for pattern in VIDEO_ID_PATTERNS:
-        m = pattern.search(url)
-        if m:
-            return m.group(1)
-    return None
+    m = VIDEO_ID_PATTERN.search(url)
+    return m.group(1) if m else None
 
 
 class AnalysisService:
     def __init__(self, pipeline: AnalysisPipeline, job_repository: object) -> None:
         self._pipeline = pipeline
         self._job_repo = job_repository
+        # Jobs beyond MAX_CONCURRENT_JOBS queue in the pool; only reject
+        # once the queue behind them is full too.
+        self._admission = threading.BoundedSemaphore(MAX_CONCURRENT_JOBS + QUEUE_DEPTH)
+        self._job_pool = ThreadPoolExecutor(
+            max_workers=MAX_CONCURRENT_JOBS, thread_name_prefix="job"
+        )
+        # Jobs handed to the pool that have not finished yet
+        self._pending: dict[str, Future] = {}
+
+    def close(self) -> None:
+        """Stop accepting work and fail jobs still waiting for a worker."""
+        pending = dict(self._pending)
+        self._job_pool.shutdown(wait=False, cancel_futures=True)
+        # Queued jobs are already persisted; without this they would stay
+        # QUEUED and keep their cache key although nothing will run them
+        for job_id, future in pending.items():
+            if future.cancelled():
+                self._job_repo.set_error(job_id, "Server shut down before the job started")
 
     def submit(self, url: str, genre: object | None = None) -> dict[str, str]:
         """Submit a URL for analysis. Returns {"job_id": ...} or raises."""
@@ -39,21 +56,38 @@ class AnalysisService:
         cached_job_id = self._job_repo.get_cached_job_id(cache_key)
         if cached_job_id:
             cached = self._job_repo.get(cached_job_id)
-            if cached and cached.status == JobStatus.COMPLETE:
+            # Coalesce onto finished and in-flight jobs; only a failed or
+            # vanished job is cleared so it can be retried. In-flight jobs
+            # are visible here even when they run on another worker.
+            if cached and cached.status != JobStatus.FAILED:
                 return {"job_id": cached_job_id}
-            if cached and cached.status == JobStatus.FAILED:
-                self._job_repo.remove(cached_job_id, cache_key)
+            self._job_repo.remove(cached_job_id, cache_key)
 
-        if self._job_repo.active_count >= MAX_CONCURRENT_JOBS:
+        if not self._admission.acquire(blocking=False):
             raise RuntimeError("Too many active jobs. Try again later.")
 
         job_id = uuid.uuid4().hex[:12]
-        job = self._job_repo.create(job_id, url)
-        job.video_id = video_id
-        job.genre = genre
-        self._job_repo.set_cache(cache_key, job_id)
+        # Set the fields up front: a Redis-backed repository persists the
+        # job as soon as it is created
+        self._job_repo.create(job_id, url, video_id=video_id, genre=genre)
+
+        # Single-flight: if a concurrent submission for the same key got
+        # there first, drop our job and share theirs
+        owner_job_id = self._job_repo.claim_cache(cache_key, job_id)
+        if owner_job_id != job_id:
+            self._job_repo.remove(job_id)
+            self._admission.release()
+            return {"job_id": owner_job_id}
 
-        thread = threading.Thread(target=self._pipeline.run, args=(job_id,), daemon=True)
-        thread.start()
+        future = self._job_pool.submit(self._run_job, job_id)
+        self._pending[job_id] = future
+        future.add_done_callback(lambda _: self._pending.pop(job_id, None))
 
         return {"job_id": job_id}
+
+    def _run_job(self, job_id: str) -> None:
+        """Run the pipeline for a job, then free its admission slot."""
+        try:
+            self._pipeline.run(job_id)
+        finally:
+            self._admission.release()
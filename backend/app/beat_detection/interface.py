@@ -2,8 +2,14 @@ from __future__ import annotations
 
 from typing import Protocol
 
+import numpy as np
+
 from app.beat_detection.models import BeatDetectionResult
 
 
 class BeatDetector(Protocol):
     def detect(self, audio_path: str) -> BeatDetectionResult: ...
+
+    def detect_from_array(self, y: np.ndarray, sr: int) -> BeatDetectionResult: ...
+
+    def close(self) -> None: ...
@@ -1,28 +1,93 @@
 from __future__ import annotations
 
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+
 import numpy as np
 
 from app.beat_detection.models import BarInfo, BeatDetectionResult, BeatInfo
 
+SAMPLE_RATE = 44100
+
 
 class MadmomBeatDetector:
+    def __init__(self) -> None:
+        # madmom's recurrent layers keep their hidden state on the layer
+        # object, so each cached network may only run one signal at a time
+        self._beat_rnn_lock = threading.Lock()
+        self._downbeat_rnn_lock = threading.Lock()
+
+    @cached_property
+    def _beat_rnn(self) -> object:
+        from madmom.features.beats import RNNBeatProcessor
+
+        return RNNBeatProcessor()
+
+    @cached_property
+    def _downbeat_rnn(self) -> object:
+        from madmom.features.downbeats import RNNDownBeatProcessor
+
+        return RNNDownBeatProcessor()
+
+    @cached_property
+    def _beat_dbn(self) -> object:
+        from madmom.features.beats import DBNBeatTrackingProcessor
+
+        return DBNBeatTrackingProcessor(fps=100)
+
+    @cached_property
+    def _downbeat_dbn(self) -> object:
+        from madmom.features.downbeats import DBNDownBeatTrackingProcessor
+
+        return DBNDownBeatTrackingProcessor(beats_per_bar=[4], fps=100)
+
     def detect(self, audio_path: str) -> BeatDetectionResult:
-        from madmom.features.beats import DBNBeatTrackingProcessor, RNNBeatProcessor
-        from madmom.features.downbeats import (
-            DBNDownBeatTrackingProcessor,
-            RNNDownBeatProcessor,
-        )
+        from madmom.audio.signal import Signal
+
+        # Decode once and share the signal between both networks
+        signal = Signal(audio_path, sample_rate=SAMPLE_RATE, num_channels=1)
+        return self._detect_signal(signal)
+
+    def detect_from_array(self, y: np.ndarray, sr: int) -> BeatDetectionResult:
+        """Detect beats on an already-decoded mono float signal."""
+        from madmom.audio.signal import Signal
+
+        if sr != SAMPLE_RATE:
+            import librosa
+
+            y = librosa.resample(y, orig_sr=sr, target_sr=SAMPLE_RATE)
+        signal = Signal(y, sample_rate=SAMPLE_RATE, num_channels=1)
+        return self._detect_signal(signal)
+
+    @cached_property
+    def _pool(self) -> ThreadPoolExecutor:
+        # Long-lived so each detection does not spawn and join a thread
+        return ThreadPoolExecutor(max_workers=2, thread_name_prefix="madmom")
+
+    def _run_downbeat_rnn(self, signal: object) -> object:
+        with self._downbeat_rnn_lock:
+            return self._downbeat_rnn(signal)
+
+    def close(self) -> None:
+        """Shut down the downbeat worker pool, if a detection ever started it."""
+        if "_pool" in self.__dict__:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _detect_signal(self, signal: object) -> BeatDetectionResult:
+        # The downbeat network runs beside the beat network, which stays on
+        # the calling thread
+        downbeat_future = self._pool.submit(self._run_downbeat_rnn, signal)
 
         # Beat detection
-        beat_proc = RNNBeatProcessor()(audio_path)
-        beat_tracker = DBNBeatTrackingProcessor(fps=100)
-        beat_times = beat_tracker(beat_proc)
+        with self._beat_rnn_lock:
+            beat_proc = self._beat_rnn(signal)
+        beat_times = self._beat_dbn(beat_proc)
 
         # Downbeat detection
         try:
-            downbeat_proc = RNNDownBeatProcessor()(audio_path)
-            downbeat_tracker = DBNDownBeatTrackingProcessor(beats_per_bar=[4], fps=100)
-            downbeat_result = downbeat_tracker(downbeat_proc)
+            downbeat_proc = downbeat_future.result()
+            downbeat_result = self._downbeat_dbn(downbeat_proc)
             downbeat_times = downbeat_result[:, 0]
             beat_positions = downbeat_result[:, 1].astype(int)
         except Exception:
@@ -37,35 +102,28 @@ class MadmomBeatDetector:
         else:
             tempo = 120.0
 
-        # Build beat list with 8-count (two bars of 4)
-        beats_raw = []
-        for t, pos in zip(downbeat_times, beat_positions):
-            beats_raw.append({"time": float(t), "beat_num": int(pos)})
+        times = np.asarray(downbeat_times, dtype=float)
+        positions = np.asarray(beat_positions, dtype=int)
+        is_downbeat = positions == 1
 
         # Extend to 8-count: beats 5-8 are the second bar of 4
-        eight_count_beats = []
-        bar_cycle = 0
-        for b in beats_raw:
-            num = b["beat_num"]
-            if num == 1:
-                bar_cycle += 1
-            adjusted = num if (bar_cycle % 2 == 1) else num + 4
-            eight_count_beats.append({"time": b["time"], "beat_num": adjusted})
-
-        # Build bars
-        bars_raw: list[dict] = []
-        bar_start = None
-        bar_num = 0
-        for b in beats_raw:
-            if b["beat_num"] == 1:
-                if bar_start is not None:
-                    bars_raw.append({"start": bar_start, "end": b["time"], "bar_num": bar_num})
-                bar_num += 1
-                bar_start = b["time"]
-        if bar_start is not None and len(beats_raw) > 0:
-            bars_raw.append({"start": bar_start, "end": beats_raw[-1]["time"], "bar_num": bar_num})
-
-        beats = [BeatInfo(time=b["time"], beat_num=b["beat_num"]) for b in eight_count_beats]
-        bars = [BarInfo(start=b["start"], end=b["end"], bar_num=b["bar_num"]) for b in bars_raw]
+        bar_cycle = np.cumsum(is_downbeat)
+        adjusted = np.where(bar_cycle % 2 == 1, positions, positions + 4)
+
+        # Build bars: each downbeat opens a bar that closes at the next one
+        downbeat_idx = np.flatnonzero(is_downbeat)
+        bar_starts = times[downbeat_idx]
+        bar_ends = np.concatenate([times[downbeat_idx[1:]], times[-1:]])
+
+        beats = [
+            BeatInfo(time=t, beat_num=n)
+            for t, n in zip(times.tolist(), adjusted.tolist())
+        ]
+        bars = [
+            BarInfo(start=start, end=end, bar_num=bar_num)
+            for bar_num, (start, end) in enumerate(
+                zip(bar_starts.tolist(), bar_ends.tolist()), start=1
+            )
+        ]
 
         return BeatDetectionResult(beats=beats, bars=bars, tempo=tempo)
@@ -6,6 +6,7 @@ Change one line here to swap any implementation
 
 from __future__ import annotations
 
+import os
 from functools import lru_cache
 
 from app.analysis.pipeline import AnalysisPipeline
@@ -20,6 +21,11 @@ from app.separator.demucs_separator import DemucsSourceSeparator
 
 @lru_cache
 def get_job_repository() -> InMemoryJobRepository:
+    redis_url = os.environ.get("REDIS_URL")
+    if redis_url:
+        from app.jobs.redis_repository import RedisJobRepository
+
+        return RedisJobRepository(redis_url)
     return InMemoryJobRepository()
 
 
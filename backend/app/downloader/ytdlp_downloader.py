@@ -1,7 +1,6 @@
 from __future__ import annotations
 
 import tempfile
-from pathlib import Path
 
 import yt_dlp
 
@@ -13,11 +12,11 @@ class YtDlpAudioDownloader:
         if output_dir is None:
             output_dir = tempfile.mkdtemp(prefix="musicality_")
 
-        output_path = str(Path(output_dir) / "audio.wav")
+        output_path = f"{output_dir}/audio.wav"
 
         ydl_opts = {
             "format": "bestaudio/best",
-            "outtmpl": str(Path(output_dir) / "audio.%(ext)s"),
+            "outtmpl": f"{output_dir}/audio.%(ext)s",
             "postprocessors": [
                 {
                     "key": "FFmpegExtractAudio",
@@ -6,4 +6,4 @@ from app.genre.models import InstrumentTemplate
 
 
 class GenreTemplateProvider(Protocol):
-    def get_templates(self, genre: str) -> list[InstrumentTemplate]: ...
+    def get_templates(self, genre: str) -> tuple[InstrumentTemplate, ...]: ...
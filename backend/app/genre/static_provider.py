@@ -3,7 +3,7 @@ from __future__ import annotations
 from app.genre.models import InstrumentTemplate
 
 
-BACHATA_TEMPLATES: list[InstrumentTemplate] = [
+BACHATA_TEMPLATES: tuple[InstrumentTemplate, ...] = (
     InstrumentTemplate(
         name="guira",
         display_name="Guira",
@@ -46,10 +46,10 @@ BACHATA_TEMPLATES: list[InstrumentTemplate] = [
         stem="vocals",
         freq_band="mid",
     ),
-]
+)
 
 
-SALSA_TEMPLATES: list[InstrumentTemplate] = [
+SALSA_TEMPLATES: tuple[InstrumentTemplate, ...] = (
     InstrumentTemplate(
         name="conga",
         display_name="Conga",
@@ -110,13 +110,15 @@ SALSA_TEMPLATES: list[InstrumentTemplate] = [
         stem="vocals",
         freq_band="mid",
     ),
-]
+)
+
+
+GENRE_TEMPLATES: dict[str, tuple[InstrumentTemplate, ...]] = {
+    "bachata": BACHATA_TEMPLATES,
+    "salsa": SALSA_TEMPLATES,
+}
 
 
 class StaticGenreTemplateProvider:
-    def get_templates(self, genre: str) -> list[InstrumentTemplate]:
-        if genre == "bachata":
-            return BACHATA_TEMPLATES
-        elif genre == "salsa":
-            return SALSA_TEMPLATES
-        return BACHATA_TEMPLATES
+    def get_templates(self, genre: str) -> tuple[InstrumentTemplate, ...]:
+        return GENRE_TEMPLATES.get(genre, BACHATA_TEMPLATES)
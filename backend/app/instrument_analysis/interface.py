@@ -12,3 +12,5 @@ class InstrumentAnalyzer(Protocol):
         stems_dir: str | None,
         tempo: float,
     ) -> dict: ...
+
+    def close(self) -> None: ...
@@ -3,24 +3,29 @@
 from __future__ import annotations
 
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
-import librosa
 import numpy as np
 
 from app.genre.models import FREQ_BANDS, InstrumentTemplate
 from app.instrument_analysis.pattern_smoother import PatternSmoother
 from app.instrument_analysis.signal_processing import (
-    bandpass_filter,
-    compute_onset_velocity,
-    compute_spectral_pitch,
+    bandpass_filter_multi,
+    compute_onset_velocities,
+    detect_onsets,
     has_energy_at_onset,
     load_stems,
-    snap_to_subdivision,
+    onset_spectral_pitches,
+    onset_velocity_curve,
+    onset_window_rms,
+    snap_to_subdivisions,
 )
 from app.instrument_analysis.subdivision_grid import NUM_SUBDIVISIONS, SubdivisionGridBuilder
 
 logger = logging.getLogger(__name__)
 
+PRECOMPUTE_WORKERS = 4
+
 
 class OnsetInstrumentAnalyzer:
     def __init__(
@@ -32,6 +37,14 @@ class OnsetInstrumentAnalyzer:
         self._template_provider = template_provider
         self._grid_builder = grid_builder or SubdivisionGridBuilder()
         self._smoother = smoother or PatternSmoother()
+        # Shared across analyses so threads are not spawned and torn down per run
+        self._pool = ThreadPoolExecutor(
+            max_workers=PRECOMPUTE_WORKERS, thread_name_prefix="onsets"
+        )
+
+    def close(self) -> None:
+        """Shut down the analyzer's worker pool."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
 
     def analyze(
         self,
@@ -50,76 +63,165 @@ class OnsetInstrumentAnalyzer:
         if not cycles or not stems_dir:
             return self._empty_result(genre, templates, cycles)
 
-        stems_audio = load_stems(stems_dir)
+        stems_audio = load_stems(stems_dir, self._pool)
         if not stems_audio:
             return self._empty_result(genre, templates, cycles)
 
-        # Precompute onset times and envelopes for each stem
+        # Precompute onset times, envelopes, and bandpass-filtered stems.
+        # Each job is independent and spends most of its time in GIL-releasing
+        # NumPy/SciPy kernels, so run them side by side.
         stem_onset_times: dict[str, np.ndarray] = {}
-        stem_onset_envelopes: dict[str, np.ndarray] = {}
+        stem_velocity_curves: dict[str, np.ndarray | None] = {}
+        bandpass_cache: dict[tuple[str, str], np.ndarray] = {}
         hop = 512
-        for stem_name, (y, sr) in stems_audio.items():
-            env = librosa.onset.onset_strength(y=y, sr=sr, hop_length=hop)
-            onset_frames = librosa.onset.onset_detect(
-                onset_envelope=env,
-                sr=sr,
-                hop_length=hop,
-                backtrack=False,
+        onset_futures = {
+            stem_name: self._pool.submit(detect_onsets, y, sr, hop)
+            for stem_name, (y, sr) in stems_audio.items()
+        }
+
+        # One job per stem filters every band it needs in turn, so each
+        # stem is read by a single worker instead of once per band
+        stem_bands: dict[str, list[str]] = {}
+        for t in templates:
+            if t.stem in stems_audio:
+                bands = stem_bands.setdefault(t.stem, [])
+                if t.freq_band not in bands:
+                    bands.append(t.freq_band)
+        bandpass_futures = {
+            stem_name: self._pool.submit(
+                bandpass_filter_multi,
+                *stems_audio[stem_name],
+                [FREQ_BANDS[band] for band in bands],
             )
-            times = librosa.frames_to_time(onset_frames, sr=sr, hop_length=hop)
+            for stem_name, bands in stem_bands.items()
+        }
+
+        for stem_name, future in onset_futures.items():
+            env, times = future.result()
             stem_onset_times[stem_name] = times
-            stem_onset_envelopes[stem_name] = env
+            # Normalized once per stem; cycles only gather from it
+            stem_velocity_curves[stem_name] = onset_velocity_curve(env)
             logger.info("Stem '%s': %d onsets detected across full song", stem_name, len(times))
 
-        # Precompute bandpass-filtered stems
-        bandpass_cache: dict[tuple[str, str], np.ndarray] = {}
-        for t in templates:
-            key = (t.stem, t.freq_band)
-            if key not in bandpass_cache and t.stem in stems_audio:
-                y, sr = stems_audio[t.stem]
-                freq_low, freq_high = FREQ_BANDS[t.freq_band]
-                bandpass_cache[key] = bandpass_filter(y, sr, freq_low, freq_high)
+        for stem_name, future in bandpass_futures.items():
+            for band, filtered in zip(stem_bands[stem_name], future.result()):
+                bandpass_cache[(stem_name, band)] = filtered
+
+        # Pitch at every onset of the stem, per band; cycles slice it
+        pitch_futures = {
+            key: self._pool.submit(
+                onset_spectral_pitches,
+                bp,
+                stems_audio[key[0]][1],
+                stem_onset_times[key[0]],
+                key[1],
+            )
+            for key, bp in bandpass_cache.items()
+        }
+        # Window RMS at every onset, only needed where a stem's bands
+        # compete for its onsets
+        rms_futures = {
+            key: self._pool.submit(
+                onset_window_rms, bp, stems_audio[key[0]][1], stem_onset_times[key[0]]
+            )
+            for key, bp in bandpass_cache.items()
+            if len(stem_bands[key[0]]) > 1
+        }
+        band_pitches = {key: future.result() for key, future in pitch_futures.items()}
+        onset_rms = {key: future.result() for key, future in rms_futures.items()}
+
+        # Filtered signals only feed the pitches and RMS; free them (a
+        # song-length array per band) before the cycle loop
+        del bandpass_cache, bandpass_futures
 
         # Group templates by stem
         stem_templates: dict[str, list[InstrumentTemplate]] = {}
         for t in templates:
             stem_templates.setdefault(t.stem, []).append(t)
+        stem_is_single_band = {
+            stem: len({t.freq_band for t in stem_ts}) <= 1
+            for stem, stem_ts in stem_templates.items()
+        }
 
-        beat_times = [b["time"] for b in beats]
+        # Whether each band carries its share of the stem's energy at every
+        # onset of that stem; single-band stems accept all their onsets
+        onset_has_energy = {
+            (stem_name, band): has_energy_at_onset(
+                rms,
+                [other for (s, b), other in onset_rms.items() if s == stem_name and b != band],
+            )
+            for (stem_name, band), rms in onset_rms.items()
+        }
+
+        beat_times = np.asarray([b["time"] for b in beats], dtype=np.float64)
 
         # Compute global median beat period
         median_beat_period = None
-        if len(beat_times) >= 2:
-            beat_diffs = [beat_times[i + 1] - beat_times[i] for i in range(len(beat_times) - 1)]
-            median_beat_period = float(np.median(beat_diffs))
-
-        result_bars = []
+        if beat_times.size >= 2:
+            median_beat_period = float(np.median(np.diff(beat_times)))
+
+        # Cell state for every cycle and template, kept as arrays through
+        # smoothing; dicts are only built for the returned bars
+        shape = (len(cycles), len(templates), NUM_SUBDIVISIONS)
+        active = np.zeros(shape, dtype=bool)
+        velocity = np.zeros(shape)
+        pitch = np.full(shape, 0.5)
         for cycle_num, (cycle_start, cycle_end) in enumerate(cycles):
             subdiv_times = self._grid_builder.build_grid(
                 cycle_start, cycle_end, beat_times, median_beat_period
             )
 
-            cycle_instruments = self._analyze_cycle_onsets(
+            self._analyze_cycle_onsets(
                 cycle_num,
                 cycle_start,
                 cycle_end,
                 subdiv_times,
                 templates,
-                stem_templates,
+                stem_is_single_band,
                 stems_audio,
                 stem_onset_times,
-                stem_onset_envelopes,
-                bandpass_cache,
+                stem_velocity_curves,
+                band_pitches,
+                onset_has_energy,
                 hop,
+                active[cycle_num],
+                velocity[cycle_num],
+                pitch[cycle_num],
             )
 
+        # An instrument appears in a cycle when any of its cells fired.
+        # Confidence is the mean active velocity before smoothing; cumsum
+        # adds left to right like sum() over the active cells.
+        present = active.any(axis=2)
+        counts = active.sum(axis=2)
+        vel_totals = np.cumsum(np.where(active, velocity, 0.0), axis=2)[:, :, -1]
+        confidence = np.divide(
+            vel_totals, counts, out=np.zeros(present.shape), where=present
+        )
+
+        self._smoother.smooth_grid(active, velocity, pitch, present)
+
+        result_bars = []
+        for cycle_num in range(len(cycles)):
+            instruments = []
+            for t in np.flatnonzero(present[cycle_num]).tolist():
+                instruments.append({
+                    "instrument": templates[t].name,
+                    "beats": [
+                        {"active": on, "velocity": vel, "pitch": pit}
+                        for on, vel, pit in zip(
+                            active[cycle_num, t].tolist(),
+                            velocity[cycle_num, t].tolist(),
+                            pitch[cycle_num, t].tolist(),
+                        )
+                    ],
+                    "confidence": round(float(confidence[cycle_num, t]), 3),
+                })
             result_bars.append({
                 "bar_num": cycle_num,
-                "instruments": cycle_instruments,
+                "instruments": instruments,
             })
 
-        result_bars = self._smoother.smooth(result_bars)
-
         return {
             "genre": genre,
             "instrument_list": instrument_names,
@@ -132,91 +234,83 @@ class OnsetInstrumentAnalyzer:
         cycle_num: int,
         cycle_start: float,
         cycle_end: float,
-        subdiv_times: list[float],
-        templates: list[InstrumentTemplate],
-        stem_templates: dict[str, list[InstrumentTemplate]],
+        subdiv_times: np.ndarray,
+        templates: tuple[InstrumentTemplate, ...],
+        stem_is_single_band: dict[str, bool],
         stems_audio: dict[str, tuple[np.ndarray, int]],
         stem_onset_times: dict[str, np.ndarray],
-        stem_onset_envelopes: dict[str, np.ndarray],
-        bandpass_cache: dict[tuple[str, str], np.ndarray],
+        stem_velocity_curves: dict[str, np.ndarray | None],
+        band_pitches: dict[tuple[str, str], np.ndarray],
+        onset_has_energy: dict[tuple[str, str], np.ndarray],
         hop: int,
-    ) -> list[dict]:
-        """Analyze all instruments for a single cycle using onset detection."""
-        cycle_onsets: dict[str, list[float]] = {}
+        cell_active: np.ndarray,
+        cell_velocity: np.ndarray,
+        cell_pitch: np.ndarray,
+    ) -> None:
+        """Analyze all instruments for a single cycle using onset detection.
+
+        Fills this cycle's (templates, subdivisions) cell arrays in place:
+        activation, velocity and pitch, the latter two rounded as emitted.
+        """
+        # Onset times are sorted, so each cycle is a contiguous slice
+        cycle_onsets: dict[str, np.ndarray] = {}
+        cycle_slices: dict[str, slice] = {}
         for stem_name, all_onsets in stem_onset_times.items():
-            mask = (all_onsets >= cycle_start) & (all_onsets < cycle_end)
-            cycle_onsets[stem_name] = list(all_onsets[mask])
+            lo, hi = np.searchsorted(all_onsets, (cycle_start, cycle_end), side="left")
+            cycle_slices[stem_name] = slice(lo, hi)
+            cycle_onsets[stem_name] = all_onsets[lo:hi]
 
-        instruments = []
-        for template in templates:
+        for t, template in enumerate(templates):
             if template.stem not in stems_audio:
                 continue
 
-            onsets = cycle_onsets.get(template.stem, [])
-            stem_bands = {t.freq_band for t in stem_templates.get(template.stem, [])}
-            is_single_band = len(stem_bands) <= 1
+            onsets = cycle_onsets.get(template.stem)
+            # A stem silent in this cycle leaves its templates' cells inactive
+            if onsets is None or onsets.size == 0:
+                continue
 
-            pattern = [{"active": False, "velocity": 0.0, "pitch": 0.5}
-                        for _ in range(NUM_SUBDIVISIONS)]
-            y, sr = stems_audio[template.stem]
-            onset_env = stem_onset_envelopes.get(template.stem)
+            is_single_band = stem_is_single_band[template.stem]
+            _, sr = stems_audio[template.stem]
+            velocity_curve = stem_velocity_curves.get(template.stem)
 
-            for onset_time in onsets:
-                subdiv_idx = snap_to_subdivision(onset_time, subdiv_times, cycle_end)
-                if subdiv_idx < 0 or subdiv_idx >= NUM_SUBDIVISIONS:
-                    continue
+            onset_pitches = band_pitches.get((template.stem, template.freq_band))
+            subdiv_indices = snap_to_subdivisions(onsets, subdiv_times, cycle_end)
+            velocities = compute_onset_velocities(onsets, velocity_curve, sr, hop)
 
-                activated = False
-                if is_single_band:
-                    activated = True
+            activated = (subdiv_indices >= 0) & (subdiv_indices < NUM_SUBDIVISIONS)
+            if not is_single_band:
+                has_energy = onset_has_energy.get((template.stem, template.freq_band))
+                if has_energy is None:
+                    activated[:] = False
                 else:
-                    bp_key = (template.stem, template.freq_band)
-                    bp_signal = bandpass_cache.get(bp_key)
-                    if bp_signal is None:
-                        continue
-
-                    if has_energy_at_onset(
-                        bp_signal, sr, onset_time, template.freq_band,
-                        template.stem, bandpass_cache, stem_templates,
-                    ):
-                        activated = True
-
-                if activated:
-                    velocity = compute_onset_velocity(onset_time, onset_env, sr, hop)
-                    bp_key = (template.stem, template.freq_band)
-                    bp_signal = bandpass_cache.get(bp_key)
-                    pitch = compute_spectral_pitch(
-                        bp_signal, sr, onset_time, template.freq_band
-                    ) if bp_signal is not None else 0.5
-                    pattern[subdiv_idx] = {
-                        "active": True,
-                        "velocity": velocity,
-                        "pitch": pitch,
-                    }
-
-            if any(cell["active"] for cell in pattern):
-                active_velocities = [cell["velocity"] for cell in pattern if cell["active"]]
-                confidence = sum(active_velocities) / len(active_velocities) if active_velocities else 0.7
-                instruments.append({
-                    "instrument": template.name,
-                    "beats": pattern,
-                    "confidence": round(confidence, 3),
-                })
+                    activated &= has_energy[cycle_slices[template.stem]]
+
+            if onset_pitches is not None:
+                pitches = onset_pitches[cycle_slices[template.stem]][activated]
+            else:
+                pitches = np.full(int(activated.sum()), 0.5)
+
+            # Later onsets in the same subdivision overwrite earlier ones:
+            # keep the last accepted onset per subdivision. Velocities and
+            # pitches stay unrounded until stored.
+            hit_subdivs = subdiv_indices[activated][::-1]
+            cells, last = np.unique(hit_subdivs, return_index=True)
+            cell_active[t, cells] = True
+            cell_velocity[t, cells] = np.round(velocities[activated][::-1][last], 3)
+            cell_pitch[t, cells] = np.round(pitches[::-1][last], 3)
 
         if cycle_num == 0:
             logger.info(
                 "Cycle 0: %d onsets across stems %s → %d instruments",
                 sum(len(v) for v in cycle_onsets.values()),
                 {k: len(v) for k, v in cycle_onsets.items()},
-                len(instruments),
+                int(cell_active.any(axis=1).sum()),
             )
 
-        return instruments
-
     def _empty_result(
         self,
         genre: str,
-        templates: list[InstrumentTemplate],
+        templates: tuple[InstrumentTemplate, ...],
         cycles: list[tuple[float, float]],
     ) -> dict:
         """Fallback: return empty grid when stems are unavailable."""
@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+import numpy as np
+
 from app.instrument_analysis.subdivision_grid import NUM_SUBDIVISIONS
 
 SMOOTH_WINDOW_MIN_SECTION = 3
@@ -15,161 +17,177 @@ class PatternSmoother:
         if len(result_bars) < SMOOTH_WINDOW_MIN_SECTION:
             return result_bars
 
-        all_instruments: set[str] = set()
+        # Per-bar instrument lookup; values alias the dicts inside result_bars
+        # so consensus writes through. First entry wins, as with a scan.
+        inst_cols: dict[str, int] = {}
+        bar_index: list[dict[str, dict]] = []
         for bar in result_bars:
+            index: dict[str, dict] = {}
             for inst in bar["instruments"]:
-                all_instruments.add(inst["instrument"])
-
-        for inst_name in all_instruments:
-            patterns: list[list[bool] | None] = []
-            for bar in result_bars:
-                inst_data = next(
-                    (i for i in bar["instruments"] if i["instrument"] == inst_name),
-                    None,
-                )
-                if inst_data is None:
-                    patterns.append(None)
-                else:
-                    patterns.append([
-                        cell["active"] if isinstance(cell, dict) else cell
-                        for cell in inst_data["beats"]
-                    ])
-
-            sections = self.segment_into_sections(patterns, SECTION_BREAK_THRESHOLD)
+                index.setdefault(inst["instrument"], inst)
+                inst_cols.setdefault(inst["instrument"], len(inst_cols))
+            bar_index.append(index)
+
+        # Unpack every cell once into (bars, instruments, subdivisions).
+        # ``hits`` marks active dict cells, whose velocity/pitch feed the
+        # neighbour averages in _apply_consensus.
+        shape = (len(bar_index), len(inst_cols), NUM_SUBDIVISIONS)
+        active = np.zeros(shape, dtype=bool)
+        hits = np.zeros(shape, dtype=bool)
+        velocity = np.zeros(shape)
+        pitch = np.zeros(shape)
+        present = np.zeros(shape[:2], dtype=bool)
+        for bar_idx, index in enumerate(bar_index):
+            for inst_name, inst_data in index.items():
+                k = inst_cols[inst_name]
+                present[bar_idx, k] = True
+                beats = inst_data["beats"]
+                # A row is either all cell dicts (as the analyzer and
+                # _apply_consensus emit) or all plain booleans
+                if not beats:
+                    continue
+                if not isinstance(beats[0], dict):
+                    active[bar_idx, k] = beats
+                    continue
+                for s, cell in enumerate(beats):
+                    if cell["active"]:
+                        active[bar_idx, k, s] = True
+                        hits[bar_idx, k, s] = True
+                        velocity[bar_idx, k, s] = cell.get("velocity", 0.7)
+                        pitch[bar_idx, k, s] = cell.get("pitch", 0.5)
+
+        smoothed = self.smooth_grid(active, velocity, pitch, present, hits)
+
+        # Write smoothed rows back into the cell dicts; a plain boolean row
+        # becomes dicts, and cells that stay inactive are left alone
+        inst_names = list(inst_cols)
+        for bar_idx, k in smoothed:
+            beats = bar_index[bar_idx][inst_names[k]]["beats"]
+            for s, (on, vel, pit) in enumerate(zip(
+                active[bar_idx, k].tolist(),
+                velocity[bar_idx, k].tolist(),
+                pitch[bar_idx, k].tolist(),
+            )):
+                cell = beats[s]
+                if not isinstance(cell, dict):
+                    cell = beats[s] = {}
+                elif not on and not cell["active"]:
+                    continue
+                cell["active"] = on
+                cell["velocity"] = vel
+                cell["pitch"] = pit
+
+        return result_bars
+
+    def smooth_grid(
+        self,
+        active: np.ndarray,
+        velocity: np.ndarray,
+        pitch: np.ndarray,
+        present: np.ndarray,
+        hits: np.ndarray | None = None,
+    ) -> list[tuple[int, int]]:
+        """Smooth a (bars, instruments, subdivisions) grid in place.
+
+        ``present`` marks (bar, instrument) pairs where the instrument exists.
+        ``hits`` marks cells whose velocity/pitch feed the neighbour averages
+        and defaults to ``active``. Returns the (bar, instrument) pairs that
+        were replaced by their section's consensus.
+        """
+        if hits is None:
+            hits = active
+        smoothed: list[tuple[int, int]] = []
+        if len(active) < SMOOTH_WINDOW_MIN_SECTION:
+            return smoothed
+
+        for k in range(active.shape[1]):
+            # Too few bars for any section to qualify
+            if present[:, k].sum() < SMOOTH_WINDOW_MIN_SECTION:
+                continue
+
+            sections = self.segment_into_sections(
+                active[:, k], present[:, k], SECTION_BREAK_THRESHOLD
+            )
 
             for section_indices in sections:
+                # Missing bars always break a section, so any section long
+                # enough to smooth has the instrument in every bar
                 if len(section_indices) < SMOOTH_WINDOW_MIN_SECTION:
                     continue
 
-                section_patterns = [patterns[i] for i in section_indices if patterns[i] is not None]
-                if len(section_patterns) < SMOOTH_WINDOW_MIN_SECTION:
-                    continue
-
-                consensus = self.compute_consensus(section_patterns)
+                section_bits = active[section_indices, k]
+                consensus = self.compute_consensus(section_bits)
 
-                for bar_idx in section_indices:
-                    if patterns[bar_idx] is None:
-                        continue
+                hamming = (section_bits != consensus).sum(axis=1)
+                deviating = np.flatnonzero(hamming > DEVIATION_THRESHOLD)
+                if deviating.size == 0:
+                    continue
 
-                    hamming = sum(
-                        a != b for a, b in zip(patterns[bar_idx], consensus)
+                for j in deviating.tolist():
+                    bar_idx = section_indices[j]
+                    self._apply_consensus(
+                        bar_idx, consensus, section_indices,
+                        active[:, k], hits[:, k], velocity[:, k], pitch[:, k],
                     )
-                    if hamming > DEVIATION_THRESHOLD:
-                        self._apply_consensus(
-                            result_bars, bar_idx, inst_name, consensus,
-                            section_indices,
-                        )
+                    smoothed.append((bar_idx, k))
 
-        return result_bars
+        return smoothed
 
     def segment_into_sections(
         self,
-        patterns: list[list[bool] | None],
+        patterns: np.ndarray,
+        present: np.ndarray,
         threshold: float,
     ) -> list[list[int]]:
-        """Group bar indices into sections based on Jaccard similarity."""
-        sections: list[list[int]] = []
-        current_section: list[int] = [0]
-
-        for i in range(1, len(patterns)):
-            prev = patterns[i - 1]
-            curr = patterns[i]
-
-            if prev is None or curr is None:
-                if current_section:
-                    sections.append(current_section)
-                current_section = [i]
-                continue
-
-            jaccard = self.jaccard_similarity(prev, curr)
-            if jaccard < threshold:
-                sections.append(current_section)
-                current_section = [i]
-            else:
-                current_section.append(i)
-
-        if current_section:
-            sections.append(current_section)
-
-        return sections
-
-    def jaccard_similarity(self, a: list[bool], b: list[bool]) -> float:
-        """Compute Jaccard similarity between two boolean patterns."""
-        set_a = {i for i, v in enumerate(a) if v}
-        set_b = {i for i, v in enumerate(b) if v}
-
-        if not set_a and not set_b:
-            return 1.0
+        """Group bar indices into sections based on Jaccard similarity.
+
+        ``patterns`` is a (bars, subdivisions) boolean matrix and ``present``
+        marks bars where the instrument exists; a missing bar always breaks.
+        """
+        prev, curr = patterns[:-1], patterns[1:]
+        intersection = (prev & curr).sum(axis=1)
+        union = (prev | curr).sum(axis=1)
+        jaccard = np.divide(
+            intersection, union, out=np.ones(len(union)), where=union > 0
+        )
 
-        intersection = len(set_a & set_b)
-        union = len(set_a | set_b)
-        return intersection / union if union > 0 else 0.0
+        breaks = (jaccard < threshold) | ~present[:-1] | ~present[1:]
+        splits = np.flatnonzero(breaks) + 1
+        return [section.tolist() for section in np.split(np.arange(len(patterns)), splits)]
 
-    def compute_consensus(self, section_patterns: list[list[bool]]) -> list[bool]:
+    def compute_consensus(self, section_bits: np.ndarray) -> np.ndarray:
         """Compute majority-vote consensus pattern."""
-        n = len(section_patterns)
-        consensus = []
-        for subdiv in range(NUM_SUBDIVISIONS):
-            active_count = sum(1 for p in section_patterns if p[subdiv])
-            consensus.append(active_count >= n / 2)
-        return consensus
+        return section_bits.sum(axis=0) >= len(section_bits) / 2
 
     def _apply_consensus(
         self,
-        result_bars: list[dict],
         bar_idx: int,
-        inst_name: str,
-        consensus: list[bool],
+        consensus: np.ndarray,
         section_indices: list[int],
+        active: np.ndarray,
+        hits: np.ndarray,
+        velocity: np.ndarray,
+        pitch: np.ndarray,
     ) -> None:
-        """Replace a noisy bar's pattern with the consensus."""
-        bar = result_bars[bar_idx]
-        inst_data = next(
-            (i for i in bar["instruments"] if i["instrument"] == inst_name),
-            None,
-        )
-        if inst_data is None:
-            return
-
-        neighbor_velocities: list[list[float]] = [[] for _ in range(NUM_SUBDIVISIONS)]
-        neighbor_pitches: list[list[float]] = [[] for _ in range(NUM_SUBDIVISIONS)]
-
-        for idx in section_indices:
-            if idx == bar_idx:
-                continue
-            other_bar = result_bars[idx]
-            other_inst = next(
-                (i for i in other_bar["instruments"] if i["instrument"] == inst_name),
-                None,
-            )
-            if other_inst is None:
-                continue
-            for s in range(NUM_SUBDIVISIONS):
-                cell = other_inst["beats"][s]
-                if isinstance(cell, dict) and cell.get("active"):
-                    neighbor_velocities[s].append(cell.get("velocity", 0.7))
-                    neighbor_pitches[s].append(cell.get("pitch", 0.5))
-
-        for s in range(NUM_SUBDIVISIONS):
-            if consensus[s]:
-                avg_vel = (
-                    sum(neighbor_velocities[s]) / len(neighbor_velocities[s])
-                    if neighbor_velocities[s]
-                    else 0.7
-                )
-                avg_pitch = (
-                    sum(neighbor_pitches[s]) / len(neighbor_pitches[s])
-                    if neighbor_pitches[s]
-                    else 0.5
-                )
-                inst_data["beats"][s] = {
-                    "active": True,
-                    "velocity": round(avg_vel, 3),
-                    "pitch": round(avg_pitch, 3),
-                }
-            else:
-                inst_data["beats"][s] = {
-                    "active": False,
-                    "velocity": 0.0,
-                    "pitch": 0.5,
-                }
+        """Replace a noisy bar's pattern with the consensus.
+
+        The arrays are this instrument's (bars, subdivisions) views from
+        ``smooth_grid``; they are updated in place so later bars in the
+        section average over the smoothed pattern.
+        """
+        neighbors = [idx for idx in section_indices if idx != bar_idx]
+        neighbor_hits = hits[neighbors]
+        counts = neighbor_hits.sum(axis=0)
+        vel_sums = np.where(neighbor_hits, velocity[neighbors], 0.0).sum(axis=0)
+        pitch_sums = np.where(neighbor_hits, pitch[neighbors], 0.0).sum(axis=0)
+
+        safe_counts = np.maximum(counts, 1)
+        avg_vels = np.where(counts > 0, vel_sums / safe_counts, 0.7)
+        avg_pitches = np.where(counts > 0, pitch_sums / safe_counts, 0.5)
+
+        # Active cells take the rounded neighbour averages; inactive cells
+        # carry the default velocity/pitch
+        velocity[bar_idx] = np.where(consensus, [round(v, 3) for v in avg_vels.tolist()], 0.0)
+        pitch[bar_idx] = np.where(consensus, [round(p, 3) for p in avg_pitches.tolist()], 0.5)
+        active[bar_idx] = consensus
+        hits[bar_idx] = consensus
@@ -7,13 +7,17 @@ energy attribution, onset snapping, and stem loading.
 from __future__ import annotations
 
 import logging
+import os
+from concurrent.futures import Executor
+from functools import lru_cache
 from pathlib import Path
 
 import librosa
 import numpy as np
+import soundfile as sf
 from scipy.signal import butter, sosfilt
 
-from app.genre.models import FREQ_BANDS, InstrumentTemplate
+from app.genre.models import FREQ_BANDS
 
 logger = logging.getLogger(__name__)
 
@@ -22,155 +26,276 @@ ENERGY_RATIO_THRESHOLD = 0.4
 PRESENCE_THRESHOLD = 0.005
 SNAP_TOLERANCE = 0.4
 SPECTRAL_WINDOW_SEC = 0.050
+SPECTRAL_N_FFT = 1024
+SPECTRAL_BATCH_WINDOWS = 1024
+STEM_SAMPLE_RATE = 22050
+STEM_BLOCK_FRAMES = 1 << 18
+# Two songs' worth of stems
+STEM_CACHE_SIZE = 12
 
 
-def bandpass_filter(
-    signal: np.ndarray, sr: int, low_hz: float, high_hz: float
-) -> np.ndarray:
-    """Apply a Butterworth bandpass filter."""
+@lru_cache(maxsize=64)
+def _design_bandpass(sr: int, low_hz: float, high_hz: float) -> np.ndarray | None:
+    """Design (and memoize) the Butterworth SOS for a band, or None to pass through.
+
+    Coefficients are designed in float64 and stored as float32 so sosfilt
+    runs its single-precision kernel on float32 stems.
+    """
     nyquist = sr / 2.0
     low = max(low_hz / nyquist, 0.001)
     high = min(high_hz / nyquist, 0.999)
 
     if low >= high:
-        return signal
+        return None
 
     try:
         sos = butter(4, [low, high], btype="band", output="sos")
-        return sosfilt(sos, signal)
     except Exception:
+        return None
+    return sos.astype(np.float32)
+
+
+def bandpass_filter(
+    signal: np.ndarray, sr: int, low_hz: float, high_hz: float
+) -> np.ndarray:
+    """Apply a Butterworth bandpass filter."""
+    sos = _design_bandpass(sr, low_hz, high_hz)
+    if sos is None:
         return signal
 
+    try:
+        return sosfilt(sos, np.ascontiguousarray(signal, dtype=np.float32))
+    except Exception:
+        return signal
+
+
+def bandpass_filter_multi(
+    signal: np.ndarray, sr: int, bands: list[tuple[float, float]]
+) -> list[np.ndarray]:
+    """Apply several Butterworth bandpass filters to the same signal.
+
+    Returns one filtered signal per band, in the order given.
+    """
+    return [bandpass_filter(signal, sr, low_hz, high_hz) for low_hz, high_hz in bands]
 
-def compute_onset_velocity(
-    onset_time: float,
-    onset_env: np.ndarray | None,
-    sr: int,
-    hop: int,
-) -> float:
-    """Look up onset strength and return normalized 0.0-1.0 velocity."""
-    if onset_env is None or len(onset_env) == 0:
-        return 0.7
 
-    frame = int(onset_time * sr / hop)
-    frame = max(0, min(frame, len(onset_env) - 1))
-    strength = onset_env[frame]
+def detect_onsets(
+    y: np.ndarray, sr: int, hop: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Compute the onset strength envelope and onset times for a stem."""
+    env = librosa.onset.onset_strength(y=y, sr=sr, hop_length=hop)
+    onset_frames = librosa.onset.onset_detect(
+        onset_envelope=env,
+        sr=sr,
+        hop_length=hop,
+        backtrack=False,
+    )
+    times = librosa.frames_to_time(onset_frames, sr=sr, hop_length=hop)
+    # Velocity lookups gather from the envelope, so keep it compact
+    return env.astype(np.float32, copy=False), times
+
+
+def onset_velocity_curve(onset_env: np.ndarray | None) -> np.ndarray | None:
+    """Map an onset strength envelope to 0.0-1.0 velocities, frame by frame.
+
+    Returns None when the envelope is empty or silent.
+    """
+    if onset_env is None or len(onset_env) == 0:
+        return None
 
     max_val = onset_env.max()
     if max_val <= 0:
-        return 0.7
+        return None
 
-    normalized = strength / max_val
-    compressed = float(np.power(normalized, 0.7))
-    return round(max(0.0, min(1.0, compressed)), 3)
+    return np.clip(np.power(onset_env / max_val, 0.7), 0.0, 1.0)
 
 
-def compute_spectral_pitch(
-    bp_signal: np.ndarray,
+def compute_onset_velocities(
+    onset_times: np.ndarray,
+    velocity_curve: np.ndarray | None,
     sr: int,
-    onset_time: float,
-    freq_band: str,
-) -> float:
-    """Compute spectral centroid in a window around onset, normalized within freq band."""
-    half_win = int(SPECTRAL_WINDOW_SEC * sr / 2)
-    center = int(onset_time * sr)
-    start = max(0, center - half_win)
-    end = min(len(bp_signal), center + half_win)
+    hop: int,
+) -> np.ndarray:
+    """Look up onset velocities in a stem's precomputed velocity curve."""
+    onset_times = np.asarray(onset_times, dtype=float)
+    if velocity_curve is None:
+        return np.full(onset_times.shape, 0.7)
+
+    frames = (onset_times * sr / hop).astype(int)
+    frames = np.clip(frames, 0, len(velocity_curve) - 1)
+    return velocity_curve[frames].astype(np.float64)
 
-    if end <= start:
-        return 0.5
 
-    window = bp_signal[start:end]
-    if np.max(np.abs(window)) < 1e-8:
-        return 0.5
+def onset_spectral_pitches(
+    bp_signal: np.ndarray,
+    sr: int,
+    onset_times: np.ndarray,
+    freq_band: str,
+) -> np.ndarray:
+    """Compute spectral centroid in a window around each onset, normalized within freq band.
 
-    centroid = librosa.feature.spectral_centroid(y=window, sr=sr, n_fft=min(len(window), 1024))
-    centroid_hz = float(np.mean(centroid))
+    Each onset's window is analysed on its own, zero-padded at its edges, so
+    a pitch depends only on the audio inside that window. Windows of equal
+    length are stacked and go through librosa in batches; silent or empty
+    windows get 0.5.
+    """
+    onset_times = np.asarray(onset_times, dtype=float)
+    pitches = np.full(onset_times.shape, 0.5)
 
     freq_low, freq_high = FREQ_BANDS[freq_band]
     band_range = freq_high - freq_low
-    if band_range <= 0:
-        return 0.5
-
-    normalized = (centroid_hz - freq_low) / band_range
-    return round(max(0.0, min(1.0, normalized)), 3)
+    if onset_times.size == 0 or band_range <= 0:
+        return pitches
 
+    half_win = int(SPECTRAL_WINDOW_SEC * sr / 2)
+    centers = (onset_times * sr).astype(np.int64)
+    starts = np.maximum(centers - half_win, 0)
+    widths = np.minimum(centers + half_win, len(bp_signal)) - starts
+
+    # Only windows clipped at either end of the signal are shorter
+    for width in np.unique(widths[widths > 0]).tolist():
+        same_width = np.flatnonzero(widths == width)
+        for first in range(0, same_width.size, SPECTRAL_BATCH_WINDOWS):
+            idx = same_width[first:first + SPECTRAL_BATCH_WINDOWS]
+            windows = bp_signal[starts[idx, None] + np.arange(width)]
+            loud = np.abs(windows).max(axis=1) >= 1e-8
+            if not loud.any():
+                continue
+            centroid = librosa.feature.spectral_centroid(
+                y=windows[loud], sr=sr, n_fft=min(width, SPECTRAL_N_FFT)
+            )
+            centroid_hz = centroid.mean(axis=(-2, -1)).astype(np.float64)
+            normalized = (centroid_hz - freq_low) / band_range
+            pitches[idx[loud]] = np.clip(normalized, 0.0, 1.0)
+
+    return pitches
+
+
+def onset_window_rms(
+    bp_signal: np.ndarray, sr: int, onset_times: np.ndarray
+) -> np.ndarray:
+    """RMS of a bandpass-filtered signal in the window around each onset.
 
-def has_energy_at_onset(
-    bp_signal: np.ndarray,
-    sr: int,
-    onset_time: float,
-    this_freq_band: str,
-    stem_name: str,
-    bandpass_cache: dict[tuple[str, str], np.ndarray],
-    stem_templates: dict[str, list[InstrumentTemplate]],
-) -> bool:
-    """Check if a bandpass-filtered signal has enough energy at an onset time."""
+    Uses a prefix sum of squared samples so every window costs two lookups.
+    Onsets whose window falls outside the signal get NaN.
+    """
     half_win = int(ONSET_WINDOW_SEC * sr / 2)
-    center = int(onset_time * sr)
-    start = max(0, center - half_win)
-    end = min(len(bp_signal), center + half_win)
+    centers = (onset_times * sr).astype(np.int64)
+    starts = np.clip(centers - half_win, 0, len(bp_signal))
+    ends = np.clip(centers + half_win, 0, len(bp_signal))
 
-    if end <= start:
-        return False
+    # Square and accumulate in place in one song-length buffer
+    energy = np.empty(len(bp_signal) + 1)
+    energy[0] = 0.0
+    np.square(bp_signal, out=energy[1:], dtype=np.float64)
+    np.cumsum(energy[1:], out=energy[1:])
 
-    this_rms = np.sqrt(np.mean(bp_signal[start:end] ** 2))
-    if this_rms < PRESENCE_THRESHOLD:
-        return False
+    widths = ends - starts
+    rms = np.full(len(onset_times), np.nan)
+    valid = widths > 0
+    window_energy = (energy[ends[valid]] - energy[starts[valid]]) / widths[valid]
+    rms[valid] = np.sqrt(np.maximum(window_energy, 0.0))
+    return rms
 
-    seen_bands = {this_freq_band}
+
+def has_energy_at_onset(
+    this_rms: np.ndarray, other_rms: list[np.ndarray]
+) -> np.ndarray:
+    """Check, per onset, whether a band has enough energy relative to its stem's other bands.
+
+    Takes the window RMS of this band and of each other template band of the
+    same stem (as from ``onset_window_rms``) at the same onsets.
+    """
     max_rms = this_rms
-    for t in stem_templates.get(stem_name, []):
-        if t.freq_band in seen_bands:
-            continue
-        seen_bands.add(t.freq_band)
-        other_key = (stem_name, t.freq_band)
-        other_bp = bandpass_cache.get(other_key)
-        if other_bp is not None:
-            other_start = max(0, center - half_win)
-            other_end = min(len(other_bp), center + half_win)
-            if other_end > other_start:
-                other_rms = np.sqrt(np.mean(other_bp[other_start:other_end] ** 2))
-                max_rms = max(max_rms, other_rms)
-
-    return (this_rms / max_rms) >= ENERGY_RATIO_THRESHOLD if max_rms > 0 else False
-
-
-def snap_to_subdivision(
-    onset_time: float,
-    subdiv_times: list[float],
+    for other in other_rms:
+        max_rms = np.fmax(max_rms, other)
+
+    with np.errstate(invalid="ignore"):
+        return (this_rms >= PRESENCE_THRESHOLD) & (
+            this_rms / max_rms >= ENERGY_RATIO_THRESHOLD
+        )
+
+
+def snap_to_subdivisions(
+    onset_times: np.ndarray,
+    subdiv_times: np.ndarray,
     cycle_end: float,
-) -> int:
-    """Snap an onset time to the nearest subdivision index."""
-    best_idx = -1
-    best_dist = float("inf")
-    for i, st in enumerate(subdiv_times):
-        dist = abs(onset_time - st)
-        if dist < best_dist:
-            best_dist = dist
-            best_idx = i
-
-    if best_idx >= 0:
-        if best_idx + 1 < len(subdiv_times):
-            subdiv_dur = subdiv_times[best_idx + 1] - subdiv_times[best_idx]
-        else:
-            subdiv_dur = cycle_end - subdiv_times[best_idx]
-        if subdiv_dur > 0 and best_dist / subdiv_dur > SNAP_TOLERANCE:
-            return -1
-
-    return best_idx
-
-
-def load_stems(stems_dir: str) -> dict[str, tuple[np.ndarray, int]]:
-    """Load all available stem audio files."""
-    stems = {}
-    stems_path = Path(stems_dir)
+) -> np.ndarray:
+    """Snap onset times to their nearest subdivision indices (-1 if off the grid)."""
+    onset_times = np.asarray(onset_times, dtype=float)
+    grid = np.asarray(subdiv_times, dtype=float)
+    if onset_times.size == 0 or grid.size == 0:
+        return np.full(onset_times.shape, -1, dtype=int)
+
+    # The nearest subdivision is one of the two neighbours of each onset's
+    # insertion point in the sorted grid. Ties (including repeated grid
+    # times) resolve to the lowest subdivision index, as argmin would.
+    order = np.argsort(grid, kind="stable")
+    sorted_grid = grid[order]
+    right = np.searchsorted(sorted_grid, onset_times).clip(0, len(grid) - 1)
+    left = np.searchsorted(sorted_grid, sorted_grid[(right - 1).clip(0)])
+    left_dist = np.abs(onset_times - sorted_grid[left])
+    right_dist = np.abs(onset_times - sorted_grid[right])
+    use_left = (left_dist < right_dist) | (
+        (left_dist == right_dist) & (order[left] < order[right])
+    )
+    best_idx = np.where(use_left, order[left], order[right])
+    best_dist = np.where(use_left, left_dist, right_dist)
+
+    subdiv_durs = np.diff(grid, append=cycle_end)[best_idx]
+    ratio = np.divide(
+        best_dist, subdiv_durs, out=np.zeros_like(best_dist), where=subdiv_durs > 0
+    )
+    return np.where(ratio > SNAP_TOLERANCE, -1, best_idx)
+
+
+def load_stem(stem_file: Path) -> tuple[np.ndarray, int]:
+    """Decode a stem to mono float32 block by block, then resample."""
+    with sf.SoundFile(str(stem_file)) as f:
+        native_sr = f.samplerate
+        y = np.empty(f.frames, dtype=np.float32)
+        pos = 0
+        for block in f.blocks(blocksize=STEM_BLOCK_FRAMES, dtype="float32", always_2d=True):
+            y[pos:pos + len(block)] = block.mean(axis=1)
+            pos += len(block)
+    y = y[:pos]
+
+    if native_sr != STEM_SAMPLE_RATE:
+        y = librosa.resample(y, orig_sr=native_sr, target_sr=STEM_SAMPLE_RATE)
+    return y, STEM_SAMPLE_RATE
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def _load_stem_cached(path: str, mtime_ns: int, size: int) -> tuple[np.ndarray, int]:
+    """Memoize load_stem per file version; the samples are shared, so read-only."""
+    y, sr = load_stem(Path(path))
+    y.flags.writeable = False
+    return y, sr
+
+
+def load_stems(stems_dir: str, executor: Executor) -> dict[str, tuple[np.ndarray, int]]:
+    """Load all available stem audio files, decoding them on ``executor``.
+
+    Decoded stems are cached by path, mtime and size, so analyzing the same
+    stems again (e.g. with another genre) skips decoding and resampling.
+    """
+    stem_files = {}
     for stem_name in ["drums", "bass", "vocals", "guitar", "piano", "other"]:
-        stem_file = stems_path / f"{stem_name}.wav"
-        if stem_file.exists():
-            try:
-                y, sr = librosa.load(str(stem_file), sr=22050, mono=True)
-                stems[stem_name] = (y, sr)
-            except Exception as e:
-                logger.warning(f"Failed to load stem {stem_name}: {e}")
+        path = f"{stems_dir}/{stem_name}.wav"
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        stem_files[stem_name] = (path, st.st_mtime_ns, st.st_size)
+    if not stem_files:
+        return {}
+
+    # Decoding and resampling run in C without the GIL, so stems load side by side
+    stems = {}
+    futures = {name: executor.submit(_load_stem_cached, *key) for name, key in stem_files.items()}
+    for stem_name, future in futures.items():
+        try:
+            stems[stem_name] = future.result()
+        except Exception as e:
+            logger.warning(f"Failed to load stem {stem_name}: {e}")
     return stems
@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+import numpy as np
+
 NUM_SUBDIVISIONS = 16
 GRID_REGULARIZATION_ALPHA = 0.6
 
@@ -24,43 +26,36 @@ class SubdivisionGridBuilder:
         self,
         cycle_start: float,
         cycle_end: float,
-        beat_times: list[float],
+        beat_times: np.ndarray,
         median_beat_period: float | None = None,
-    ) -> list[float]:
+    ) -> np.ndarray:
         """Build 16 subdivision timestamps for an 8-count cycle."""
-        cycle_beats = [t for t in beat_times if cycle_start <= t < cycle_end]
+        beat_times = np.asarray(beat_times, dtype=np.float64)
+        lo, hi = np.searchsorted(beat_times, (cycle_start, cycle_end), side="left")
+        cycle_beats = beat_times[lo:hi]
 
         if len(cycle_beats) < 2:
             step = (cycle_end - cycle_start) / NUM_SUBDIVISIONS
-            return [cycle_start + i * step for i in range(NUM_SUBDIVISIONS)]
+            return cycle_start + np.arange(NUM_SUBDIVISIONS) * step
 
-        subdivs = []
-        for i, bt in enumerate(cycle_beats):
-            subdivs.append(bt)
-            if i + 1 < len(cycle_beats):
-                subdivs.append((bt + cycle_beats[i + 1]) / 2.0)
-            else:
-                if i > 0:
-                    gap = bt - cycle_beats[i - 1]
-                else:
-                    gap = (cycle_end - cycle_start) / 8.0
-                subdivs.append(bt + gap / 2.0)
+        # Each beat followed by the midpoint to the next one; the last beat's
+        # half-step reuses the previous inter-beat gap
+        subdivs = np.empty(2 * len(cycle_beats))
+        subdivs[0::2] = cycle_beats
+        subdivs[1:-1:2] = (cycle_beats[:-1] + cycle_beats[1:]) / 2.0
+        subdivs[-1] = cycle_beats[-1] + (cycle_beats[-1] - cycle_beats[-2]) / 2.0
 
         if len(subdivs) < NUM_SUBDIVISIONS:
             last = subdivs[-1]
             remaining = NUM_SUBDIVISIONS - len(subdivs)
             gap = (cycle_end - last) / (remaining + 1)
-            for j in range(1, remaining + 1):
-                subdivs.append(last + j * gap)
+            subdivs = np.concatenate([subdivs, last + np.arange(1, remaining + 1) * gap])
         subdivs = subdivs[:NUM_SUBDIVISIONS]
 
         if median_beat_period is not None:
             expected = self.build_expected_grid(cycle_start, median_beat_period)
             alpha = GRID_REGULARIZATION_ALPHA
-            subdivs = [
-                alpha * local + (1 - alpha) * exp
-                for local, exp in zip(subdivs, expected)
-            ]
+            subdivs = alpha * subdivs + (1 - alpha) * expected
 
         return subdivs
 
@@ -68,11 +63,10 @@ class SubdivisionGridBuilder:
         self,
         cycle_start: float,
         median_beat_period: float,
-    ) -> list[float]:
+    ) -> np.ndarray:
         """Build an expected uniform 16-subdivision grid from median beat period."""
-        expected = []
-        for i in range(8):
-            beat_time = cycle_start + i * median_beat_period
-            expected.append(beat_time)
-            expected.append(beat_time + median_beat_period / 2.0)
-        return expected[:NUM_SUBDIVISIONS]
+        beats = cycle_start + np.arange(NUM_SUBDIVISIONS // 2) * median_beat_period
+        expected = np.empty(NUM_SUBDIVISIONS)
+        expected[0::2] = beats
+        expected[1::2] = beats + median_beat_period / 2.0
+        return expected
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import asyncio
 import threading
 import time
+from collections.abc import Callable
 
 from app.jobs.models import Job, JobStatus
 
@@ -12,16 +14,25 @@ class InMemoryJobRepository:
         self._lock = threading.Lock()
         self._cache: dict[str, str] = {}  # video_id -> job_id
         self._audio_cache: dict[str, tuple[str, str, float]] = {}  # video_id -> (path, title, duration)
+        self._stems_cache: dict[str, str] = {}  # video_id -> stems_dir
+        # Long-poll handlers waiting on a job; woken from pipeline threads
+        self._waiters: dict[str, list[tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
 
-    def create(self, job_id: str, url: str) -> Job:
-        job = Job(job_id=job_id, url=url)
+    def close(self) -> None:
+        """Release background resources; the in-memory store holds none."""
+
+    def create(
+        self, job_id: str, url: str, video_id: str | None = None, genre: object | None = None
+    ) -> Job:
+        job = Job(job_id=job_id, url=url, video_id=video_id, genre=genre)
         with self._lock:
             self._jobs[job_id] = job
         return job
 
+    # Reads skip the lock: single dict lookups are atomic under the GIL, and
+    # only mutations need to be serialized against each other.
     def get(self, job_id: str) -> Job | None:
-        with self._lock:
-            return self._jobs.get(job_id)
+        return self._jobs.get(job_id)
 
     def update_status(self, job_id: str, status: JobStatus, progress: float | None = None) -> None:
         with self._lock:
@@ -30,6 +41,7 @@ class InMemoryJobRepository:
                 job.status = status
                 if progress is not None:
                     job.progress = progress
+                self._notify(job_id)
 
     def set_error(self, job_id: str, error: str) -> None:
         with self._lock:
@@ -37,6 +49,7 @@ class InMemoryJobRepository:
             if job:
                 job.status = JobStatus.FAILED
                 job.error = error
+                self._notify(job_id)
 
     def set_result(self, job_id: str, result: object) -> None:
         with self._lock:
@@ -45,45 +58,103 @@ class InMemoryJobRepository:
                 job.status = JobStatus.COMPLETE
                 job.progress = 1.0
                 job.result = result
+                self._notify(job_id)
 
     def remove(self, job_id: str, video_id: str | None = None) -> None:
+        """Drop a job, and its cache entry if video_id still maps to it."""
         with self._lock:
             self._jobs.pop(job_id, None)
-            if video_id and video_id in self._cache:
+            # Compare-and-delete: another submitter may already have cleared
+            # and re-claimed the key for a fresh job
+            if video_id and self._cache.get(video_id) == job_id:
                 del self._cache[video_id]
 
+    async def wait_until(
+        self, job_id: str, predicate: Callable[[Job], bool], timeout: float
+    ) -> None:
+        """Wait until ``predicate(job)`` holds, the job is gone, or timeout elapses.
+
+        Re-checked after every status, error, or result update of the job.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            # Register before checking so an update in between still wakes us
+            waiter = (loop, asyncio.Event())
+            with self._lock:
+                self._waiters.setdefault(job_id, []).append(waiter)
+            try:
+                # Only updates made in this process wake the waiter, so look
+                # at the local job and never reach out to a backing store
+                job = self._jobs.get(job_id)
+                remaining = deadline - loop.time()
+                if job is None or predicate(job) or remaining <= 0:
+                    return
+                await asyncio.wait_for(waiter[1].wait(), remaining)
+            except asyncio.TimeoutError:
+                return
+            finally:
+                with self._lock:
+                    waiters = self._waiters.get(job_id)
+                    if waiters and waiter in waiters:
+                        waiters.remove(waiter)
+                        if not waiters:
+                            del self._waiters[job_id]
+
+    def _notify(self, job_id: str) -> None:
+        """Wake every long-poll waiter of a job. Call with the lock held."""
+        for loop, event in self._waiters.pop(job_id, ()):
+            loop.call_soon_threadsafe(event.set)
+
     def get_cached_job_id(self, video_id: str) -> str | None:
-        with self._lock:
-            return self._cache.get(video_id)
+        return self._cache.get(video_id)
 
     def set_cache(self, video_id: str, job_id: str) -> None:
         with self._lock:
             self._cache[video_id] = job_id
 
-    def get_audio_cache(self, video_id: str) -> tuple[str, str, float] | None:
+    def claim_cache(self, video_id: str, job_id: str) -> str:
+        """Cache job_id under video_id unless already taken; return the owner."""
         with self._lock:
-            return self._audio_cache.get(video_id)
+            return self._cache.setdefault(video_id, job_id)
+
+    def get_audio_cache(self, video_id: str) -> tuple[str, str, float] | None:
+        return self._audio_cache.get(video_id)
 
     def set_audio_cache(self, video_id: str, audio_path: str, title: str, duration: float) -> None:
         with self._lock:
             self._audio_cache[video_id] = (audio_path, title, duration)
 
+    def get_stems_cache(self, video_id: str) -> str | None:
+        return self._stems_cache.get(video_id)
+
+    def set_stems_cache(self, video_id: str, stems_dir: str) -> None:
+        with self._lock:
+            self._stems_cache[video_id] = stems_dir
+
     def cleanup_old(self, max_age_seconds: float = 3600) -> list[str]:
         now = time.time()
-        to_remove = []
+        # created_at never changes, so expiry can be decided outside the lock
+        expired = {
+            jid for jid, job in tuple(self._jobs.items())
+            if now - job.created_at > max_age_seconds
+        }
+        if not expired:
+            return []
+
         with self._lock:
-            for jid, job in list(self._jobs.items()):
-                if now - job.created_at > max_age_seconds:
-                    to_remove.append(jid)
-                    if job.video_id and job.video_id in self._cache:
-                        del self._cache[job.video_id]
-                    del self._jobs[jid]
-        return to_remove
+            for jid in expired:
+                self._jobs.pop(jid, None)
+            # Cache keys are "<video_id>:<genre>", so match on the job id
+            stale_keys = [key for key, jid in self._cache.items() if jid in expired]
+            for key in stale_keys:
+                del self._cache[key]
+        return list(expired)
 
     @property
     def active_count(self) -> int:
-        with self._lock:
-            return sum(
-                1 for j in self._jobs.values()
-                if j.status not in (JobStatus.COMPLETE, JobStatus.FAILED)
-            )
+        jobs = tuple(self._jobs.values())
+        return sum(
+            1 for j in jobs
+            if j.status not in (JobStatus.COMPLETE, JobStatus.FAILED)
+        )
@@ -1,12 +1,17 @@
 from __future__ import annotations
 
+from collections.abc import Callable
 from typing import Protocol
 
 from app.jobs.models import Job, JobStatus
 
 
 class JobRepository(Protocol):
-    def create(self, job_id: str, url: str) -> Job: ...
+    def close(self) -> None: ...
+
+    def create(
+        self, job_id: str, url: str, video_id: str | None = None, genre: object | None = None
+    ) -> Job: ...
 
     def get(self, job_id: str) -> Job | None: ...
 
@@ -18,14 +23,24 @@ class JobRepository(Protocol):
 
     def remove(self, job_id: str, video_id: str | None = None) -> None: ...
 
+    async def wait_until(
+        self, job_id: str, predicate: Callable[[Job], bool], timeout: float
+    ) -> None: ...
+
     def get_cached_job_id(self, video_id: str) -> str | None: ...
 
     def set_cache(self, video_id: str, job_id: str) -> None: ...
 
+    def claim_cache(self, video_id: str, job_id: str) -> str: ...
+
     def get_audio_cache(self, video_id: str) -> tuple[str, str, float] | None: ...
 
     def set_audio_cache(self, video_id: str, audio_path: str, title: str, duration: float) -> None: ...
 
+    def get_stems_cache(self, video_id: str) -> str | None: ...
+
+    def set_stems_cache(self, video_id: str, stems_dir: str) -> None: ...
+
     def cleanup_old(self, max_age_seconds: float = 3600) -> list[str]: ...
 
     @property
@@ -0,0 +1,274 @@
+"""Redis-backed job repository.
+
+Live jobs stay in process memory so the pipeline and long-poll handlers keep
+mutating and observing the same Job objects. Job state on every status change,
+finished results, the cache-key index, and downloaded-audio and stem locations
+are written through to Redis with a TTL so they survive restarts and can be
+shared between workers. Once a job has finished it lives in Redis; only the
+most recently finished few stay in process memory for repeat polls.
+
+Queued and running jobs also hold a short lease that the owning process keeps
+renewing. A persisted in-flight job whose lease has expired belonged to a
+process that died, so it is treated as gone and its cache key can be retaken.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable
+
+import redis
+from starlette.concurrency import run_in_threadpool
+
+from app.analysis.models import AnalysisResult
+from app.genre.models import GenreHint
+from app.jobs.in_memory_repository import InMemoryJobRepository
+from app.jobs.models import Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+RESULT_TTL_SECONDS = 86400
+REMOTE_POLL_INTERVAL = 1.0
+LOCAL_FINISHED_JOBS = 16
+LEASE_TTL_SECONDS = 30
+LEASE_RENEW_INTERVAL = 10.0
+
+# Delete a cache key only while it still points at the given job
+_DELETE_IF_OWNER = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisJobRepository(InMemoryJobRepository):
+    def __init__(self, url: str, ttl_seconds: int = RESULT_TTL_SECONDS) -> None:
+        super().__init__()
+        self._redis = redis.Redis.from_url(url)
+        self._ttl = ttl_seconds
+        self._delete_if_owner = self._redis.register_script(_DELETE_IF_OWNER)
+        # Recently finished jobs, oldest first; everything older is re-read
+        # from Redis on demand
+        self._finished: OrderedDict[str, Job] = OrderedDict()
+        # Leases on this process's in-flight jobs are renewed in the
+        # background, so a job only loses its lease when this process stops
+        self._owner = uuid.uuid4().hex
+        self._closed = threading.Event()
+        self._heartbeat = threading.Thread(
+            target=self._renew_leases, name="job-leases", daemon=True
+        )
+        self._heartbeat.start()
+
+    def close(self) -> None:
+        """Stop renewing leases; jobs still in flight lose theirs after the TTL."""
+        self._closed.set()
+        self._heartbeat.join()
+
+    def get(self, job_id: str) -> Job | None:
+        job = super().get(job_id) or self._finished.get(job_id)
+        if job is not None:
+            return job
+        return self._load_job(job_id)
+
+    # Queued and running jobs are persisted too, so another worker sees them
+    # as in flight instead of vanished and keeps coalescing onto them
+    def create(
+        self, job_id: str, url: str, video_id: str | None = None, genre: object | None = None
+    ) -> Job:
+        job = super().create(job_id, url, video_id, genre)
+        self._persist(job)
+        return job
+
+    def update_status(self, job_id: str, status: JobStatus, progress: float | None = None) -> None:
+        super().update_status(job_id, status, progress)
+        job = super().get(job_id)
+        if job is not None:
+            self._persist(job)
+
+    def set_error(self, job_id: str, error: str) -> None:
+        super().set_error(job_id, error)
+        job = super().get(job_id)
+        if job is not None:
+            self._persist(job)
+            self._retire(job)
+
+    async def wait_until(
+        self, job_id: str, predicate: Callable[[Job], bool], timeout: float
+    ) -> None:
+        if super().get(job_id) is not None:
+            await super().wait_until(job_id, predicate, timeout)
+            return
+
+        # A job running on another worker sends no local wake-ups, so re-read
+        # it from Redis at an interval, off the event loop
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            job = await run_in_threadpool(self.get, job_id)
+            remaining = deadline - loop.time()
+            if job is None or predicate(job) or remaining <= 0:
+                return
+            await asyncio.sleep(min(REMOTE_POLL_INTERVAL, remaining))
+
+    def set_result(self, job_id: str, result: object) -> None:
+        super().set_result(job_id, result)
+        job = super().get(job_id)
+        if job is None or not isinstance(result, AnalysisResult):
+            return
+        pipe = self._redis.pipeline()
+        pipe.set(f"job:{job_id}", self._dump_job(job), ex=self._ttl)
+        pipe.set(f"result:{job_id}", result.model_dump_json(), ex=self._ttl)
+        pipe.delete(f"lease:{job_id}")
+        pipe.execute()
+        self._retire(job)
+
+    def remove(self, job_id: str, video_id: str | None = None) -> None:
+        super().remove(job_id, video_id)
+        with self._lock:
+            self._finished.pop(job_id, None)
+        self._redis.delete(f"job:{job_id}", f"result:{job_id}", f"lease:{job_id}")
+        if video_id:
+            self._delete_if_owner(keys=[f"cache:{video_id}"], args=[job_id])
+
+    def get_cached_job_id(self, video_id: str) -> str | None:
+        job_id = super().get_cached_job_id(video_id)
+        if job_id is not None:
+            return job_id
+        raw = self._redis.get(f"cache:{video_id}")
+        return raw.decode() if raw is not None else None
+
+    def set_cache(self, video_id: str, job_id: str) -> None:
+        super().set_cache(video_id, job_id)
+        self._redis.set(f"cache:{video_id}", job_id, ex=self._ttl)
+
+    def claim_cache(self, video_id: str, job_id: str) -> str:
+        key = f"cache:{video_id}"
+        while True:
+            if self._redis.set(key, job_id, nx=True, ex=self._ttl):
+                super().set_cache(video_id, job_id)
+                return job_id
+            owner = self._redis.get(key)
+            if owner is not None:
+                return owner.decode()
+
+    def get_audio_cache(self, video_id: str) -> tuple[str, str, float] | None:
+        cached = super().get_audio_cache(video_id)
+        if cached is not None:
+            return cached
+        raw = self._redis.get(f"audio:{video_id}")
+        if raw is None:
+            return None
+        audio_path, title, duration = json.loads(raw)
+        return audio_path, title, float(duration)
+
+    def set_audio_cache(self, video_id: str, audio_path: str, title: str, duration: float) -> None:
+        super().set_audio_cache(video_id, audio_path, title, duration)
+        self._redis.set(
+            f"audio:{video_id}", json.dumps([audio_path, title, duration]), ex=self._ttl
+        )
+
+    def get_stems_cache(self, video_id: str) -> str | None:
+        stems_dir = super().get_stems_cache(video_id)
+        if stems_dir is not None:
+            return stems_dir
+        raw = self._redis.get(f"stems:{video_id}")
+        return raw.decode() if raw is not None else None
+
+    def set_stems_cache(self, video_id: str, stems_dir: str) -> None:
+        super().set_stems_cache(video_id, stems_dir)
+        self._redis.set(f"stems:{video_id}", stems_dir, ex=self._ttl)
+
+    def _persist(self, job: Job) -> None:
+        pipe = self._redis.pipeline()
+        pipe.set(f"job:{job.job_id}", self._dump_job(job), ex=self._ttl)
+        if job.status in (JobStatus.COMPLETE, JobStatus.FAILED):
+            pipe.delete(f"lease:{job.job_id}")
+        else:
+            pipe.set(f"lease:{job.job_id}", self._owner, ex=LEASE_TTL_SECONDS)
+        pipe.execute()
+
+    def _renew_leases(self) -> None:
+        """Heartbeat: re-arm the lease of every local queued or running job."""
+        while not self._closed.wait(LEASE_RENEW_INTERVAL):
+            in_flight = [
+                job_id for job_id, job in tuple(self._jobs.items())
+                if job.status not in (JobStatus.COMPLETE, JobStatus.FAILED)
+            ]
+            if not in_flight:
+                continue
+            pipe = self._redis.pipeline(transaction=False)
+            for job_id in in_flight:
+                pipe.set(f"lease:{job_id}", self._owner, ex=LEASE_TTL_SECONDS)
+            try:
+                pipe.execute()
+            except redis.RedisError as e:
+                logger.warning(f"Could not renew job leases: {e}")
+
+    def _retire(self, job: Job) -> None:
+        """Move a finished job out of the live jobs into the bounded recent set."""
+        with self._lock:
+            self._jobs.pop(job.job_id, None)
+            self._remember_finished(job)
+
+    def _remember_finished(self, job: Job) -> Job:
+        """Keep a finished job for repeat reads. Call with the lock held."""
+        job = self._finished.setdefault(job.job_id, job)
+        while len(self._finished) > LOCAL_FINISHED_JOBS:
+            self._finished.popitem(last=False)
+        return job
+
+    def _load_job(self, job_id: str) -> Job | None:
+        """Rehydrate a job persisted by another worker or a previous run."""
+        raw_job, raw_result, lease = self._redis.mget(
+            f"job:{job_id}", f"result:{job_id}", f"lease:{job_id}"
+        )
+        if raw_job is None:
+            return None
+
+        data = json.loads(raw_job)
+        status = JobStatus(data["status"])
+        finished = status in (JobStatus.COMPLETE, JobStatus.FAILED)
+        # An in-flight job whose lease lapsed was left behind by a process
+        # that died; treat it as gone so it can be resubmitted
+        if not finished and lease is None:
+            return None
+
+        job = Job(
+            job_id=data["job_id"],
+            url=data["url"],
+            status=status,
+            progress=data["progress"],
+            error=data.get("error"),
+            result=AnalysisResult.model_validate_json(raw_result) if raw_result else None,
+            video_id=data["video_id"],
+            genre=GenreHint(data["genre"]) if data["genre"] else None,
+            audio_path=data["audio_path"],
+            stems_dir=data["stems_dir"],
+            created_at=data["created_at"],
+        )
+        # A job still running elsewhere keeps changing, so only finished jobs
+        # are kept locally; in-flight ones are re-read on every lookup
+        if not finished:
+            return job
+        with self._lock:
+            return self._remember_finished(job)
+
+    def _dump_job(self, job: Job) -> str:
+        return json.dumps({
+            "job_id": job.job_id,
+            "url": job.url,
+            "status": job.status.value,
+            "progress": job.progress,
+            "error": job.error,
+            "video_id": job.video_id,
+            "genre": job.genre.value if job.genre else None,
+            "audio_path": job.audio_path,
+            "stems_dir": job.stems_dir,
+            "created_at": job.created_at,
+        })
@@ -1,9 +1,32 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.dependencies import get_analysis_service, get_job_repository, get_pipeline
 from app.routers import analyze, audio, jobs
 
-app = FastAPI(title="Musicality", description="Salsa/Bachata music visualization API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    yield
+    # Only close what was built; calling the getters here would construct
+    # the service, pipeline and repository just to shut them down
+    if get_analysis_service.cache_info().currsize:
+        get_analysis_service().close()
+    if get_pipeline.cache_info().currsize:
+        get_pipeline().close()
+    # Last: the service marks the jobs it drops as failed in the repository
+    if get_job_repository.cache_info().currsize:
+        get_job_repository().close()
+
+
+app = FastAPI(
+    title="Musicality",
+    description="Salsa/Bachata music visualization API",
+    lifespan=lifespan,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import os
 from pathlib import Path
 from typing import Literal
 
@@ -12,6 +13,13 @@ from app.jobs.in_memory_repository import InMemoryJobRepository
 router = APIRouter()
 
 
+def _stat_file(path: str | os.PathLike[str]) -> os.stat_result | None:
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+
 @router.get("/audio/{job_id}")
 def get_audio(
     job_id: str,
@@ -20,13 +28,13 @@ def get_audio(
     job = job_repo.get(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    if not job.audio_path or not Path(job.audio_path).exists():
+    # Stat once here and hand the result to FileResponse so it does not
+    # stat again; temp files can disappear after the job finished
+    stat_result = _stat_file(job.audio_path) if job.audio_path else None
+    if stat_result is None:
         raise HTTPException(status_code=404, detail="Audio not ready")
-    return FileResponse(
-        job.audio_path,
-        media_type="audio/wav",
-        headers={"Accept-Ranges": "bytes"},
-    )
+    # FileResponse answers Range requests with 206 and advertises Accept-Ranges
+    return FileResponse(job.audio_path, media_type="audio/wav", stat_result=stat_result)
 
 
 @router.get("/audio/{job_id}/stems/{stem_name}")
@@ -41,10 +49,7 @@ def get_stem(
     if not job.stems_dir:
         raise HTTPException(status_code=404, detail="Stems not available")
     stem_path = Path(job.stems_dir) / f"{stem_name}.wav"
-    if not stem_path.exists():
+    stat_result = _stat_file(stem_path)
+    if stat_result is None:
         raise HTTPException(status_code=404, detail=f"Stem '{stem_name}' not found")
-    return FileResponse(
-        str(stem_path),
-        media_type="audio/wav",
-        headers={"Accept-Ranges": "bytes"},
-    )
+    return FileResponse(stem_path, media_type="audio/wav", stat_result=stat_result)
@@ -1,28 +1,59 @@
 from __future__ import annotations
 
-import subprocess
 import tempfile
+from functools import cached_property
 from pathlib import Path
 
 from app.separator.models import SeparationResult
 
+MODEL_NAME = "htdemucs_6s"
+SEGMENT_SECONDS = 7
+
 
 class DemucsSourceSeparator:
-    def separate(self, audio_path: str, output_dir: str | None = None) -> SeparationResult:
-        if output_dir is None:
-            output_dir = tempfile.mkdtemp(prefix="musicality_stems_")
+    # The model is loaded once and kept in memory, so each separation skips
+    # interpreter start-up, the demucs import and loading the weights
+    @cached_property
+    def _model(self) -> object:
+        from demucs.pretrained import get_model
+
+        model = get_model(MODEL_NAME)
+        model.cpu()
+        model.eval()
+        return model
 
-        cmd = [
-            "python", "-m", "demucs",
-            "-n", "htdemucs_6s",
-            "--segment", "7",
-            "-o", output_dir,
-            audio_path,
-        ]
+    @cached_property
+    def _device(self) -> str:
+        import torch
 
-        subprocess.run(cmd, check=True, capture_output=True, text=True)
+        return "cuda" if torch.cuda.is_available() else "cpu"
 
-        audio_name = Path(audio_path).stem
-        stems_dir = str(Path(output_dir) / "htdemucs_6s" / audio_name)
+    def separate(self, audio_path: str, output_dir: str | None = None) -> SeparationResult:
+        import torch
+        from demucs.apply import apply_model
+        from demucs.audio import AudioFile, save_audio
+
+        if output_dir is None:
+            output_dir = tempfile.mkdtemp(prefix="musicality_stems_")
 
-        return SeparationResult(stems_dir=stems_dir)
+        model = self._model
+        wav = AudioFile(Path(audio_path)).read(
+            streams=0, samplerate=model.samplerate, channels=model.audio_channels
+        )
+
+        # Normalize the mix as the demucs CLI does, and undo it on the stems
+        ref = wav.mean(0)
+        wav = (wav - ref.mean()) / ref.std()
+        with torch.no_grad():
+            sources = apply_model(
+                model, wav[None], device=self._device, segment=SEGMENT_SECONDS
+            )[0]
+        sources = sources * ref.std() + ref.mean()
+
+        # Same layout the CLI writes: <output_dir>/<model>/<track>/<stem>.wav
+        stems_dir = Path(output_dir) / MODEL_NAME / Path(audio_path).stem
+        stems_dir.mkdir(parents=True, exist_ok=True)
+        for source, name in zip(sources, model.sources):
+            save_audio(source, str(stems_dir / f"{name}.wav"), samplerate=model.samplerate)
+
+        return SeparationResult(stems_dir=str(stems_dir))
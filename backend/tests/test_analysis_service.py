@@ -0,0 +1,188 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.analysis.service import MAX_CONCURRENT_JOBS, QUEUE_DEPTH, AnalysisService
+from app.genre.models import GenreHint
+from app.jobs.in_memory_repository import InMemoryJobRepository
+from app.jobs.models import JobStatus
+
+URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+class FakePipeline:
+    """Records runs; each run blocks until released, then succeeds or fails."""
+
+    def __init__(self, repo):
+        self._repo = repo
+        self.release = threading.Event()
+        self.fail = False
+        self.runs = []
+        self.finished = threading.Semaphore(0)
+
+    def run(self, job_id):
+        self.runs.append(job_id)
+        self.release.wait(5)
+        if self.fail:
+            self._repo.set_error(job_id, "boom")
+        else:
+            self._repo.set_result(job_id, object())
+        self.finished.release()
+
+
+@pytest.fixture
+def service():
+    repo = InMemoryJobRepository()
+    pipeline = FakePipeline(repo)
+    service = AnalysisService(pipeline, repo)
+    yield service, pipeline, repo
+    pipeline.release.set()
+    service.close()
+
+
+def submit_concurrently(service, count):
+    barrier = threading.Barrier(count)
+
+    def submit():
+        barrier.wait()
+        return service.submit(URL)["job_id"]
+
+    with ThreadPoolExecutor(count) as pool:
+        return [f.result() for f in [pool.submit(submit) for _ in range(count)]]
+
+
+def test_concurrent_submits_share_one_job(service):
+    service, pipeline, repo = service
+
+    job_ids = submit_concurrently(service, 8)
+
+    assert len(set(job_ids)) == 1
+    pipeline.release.set()
+    assert pipeline.finished.acquire(timeout=5)
+    assert pipeline.runs == job_ids[:1]
+    assert repo.get(job_ids[0]).status == JobStatus.COMPLETE
+
+
+def test_submit_reuses_completed_job(service):
+    service, pipeline, repo = service
+    pipeline.release.set()
+    first = service.submit(URL)["job_id"]
+    assert pipeline.finished.acquire(timeout=5)
+
+    assert service.submit(URL)["job_id"] == first
+    assert pipeline.runs == [first]
+
+
+def test_failed_job_is_retried_once(service):
+    service, pipeline, repo = service
+    pipeline.fail = True
+    pipeline.release.set()
+    failed = service.submit(URL)["job_id"]
+    assert pipeline.finished.acquire(timeout=5)
+    assert repo.get(failed).status == JobStatus.FAILED
+
+    pipeline.fail = False
+    pipeline.release.clear()
+    retried = submit_concurrently(service, 8)
+
+    assert len(set(retried)) == 1
+    assert retried[0] != failed
+    assert repo.get(failed) is None
+    pipeline.release.set()
+    assert pipeline.finished.acquire(timeout=5)
+    assert pipeline.runs == [failed, retried[0]]
+
+
+def test_genres_are_separate_jobs(service):
+    service, _, _ = service
+
+    salsa = service.submit(URL, GenreHint.SALSA)["job_id"]
+    bachata = service.submit(URL, GenreHint.BACHATA)["job_id"]
+
+    assert salsa != bachata
+
+
+class LockstepRepository(InMemoryJobRepository):
+    """Once armed, holds lookups of a job until every submitter has made one."""
+
+    held = None
+
+    def hold(self, job_id, parties):
+        self._barrier = threading.Barrier(parties)
+        self.held = job_id
+
+    def get(self, job_id):
+        job = super().get(job_id)
+        if job_id == self.held:
+            self._barrier.wait(5)
+        return job
+
+
+def test_submitters_racing_on_a_failed_job_start_one_retry():
+    repo = LockstepRepository()
+    pipeline = FakePipeline(repo)
+    service = AnalysisService(pipeline, repo)
+    try:
+        pipeline.fail = True
+        pipeline.release.set()
+        failed = service.submit(URL)["job_id"]
+        assert pipeline.finished.acquire(timeout=5)
+
+        # Both submitters see the failed job before either clears it
+        pipeline.fail = False
+        pipeline.release.clear()
+        repo.hold(failed, parties=2)
+        job_ids = submit_concurrently(service, 2)
+
+        assert len(set(job_ids)) == 1
+        assert pipeline.runs == [failed, job_ids[0]]
+    finally:
+        pipeline.release.set()
+        service.close()
+
+
+def test_invalid_url_is_rejected(service):
+    service, _, _ = service
+
+    with pytest.raises(ValueError):
+        service.submit("https://example.com/not-youtube")
+
+
+def test_close_fails_jobs_still_waiting_for_a_worker(service):
+    service, pipeline, repo = service
+    running = [service.submit(f"https://youtu.be/{c * 11}")["job_id"] for c in "ab"]
+    queued = service.submit("https://youtu.be/ccccccccccc")["job_id"]
+    deadline = time.monotonic() + 5.0
+    while len(pipeline.runs) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    service.close()
+
+    assert repo.get(queued).status == JobStatus.FAILED
+    assert sorted(pipeline.runs) == sorted(running)
+    assert all(repo.get(job_id).status != JobStatus.FAILED for job_id in running)
+
+
+def test_submissions_beyond_running_and_queued_slots_are_rejected(service):
+    service, pipeline, _ = service
+    capacity = MAX_CONCURRENT_JOBS + QUEUE_DEPTH
+    urls = [f"https://youtu.be/{c * 11}" for c in "abcdefgh"[:capacity + 2]]
+
+    accepted = [service.submit(url)["job_id"] for url in urls[:capacity]]
+    with pytest.raises(RuntimeError):
+        service.submit(urls[capacity])
+
+    # Finished jobs hand their slots back
+    pipeline.release.set()
+    for _ in accepted:
+        assert pipeline.finished.acquire(timeout=5)
+    deadline = time.monotonic() + 5.0
+    while True:
+        try:
+            service.submit(urls[capacity + 1])
+            break
+        except RuntimeError:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import time
+
+from app.jobs.in_memory_repository import InMemoryJobRepository
+from app.jobs.models import JobStatus
+
+
+def is_complete(job):
+    return job.status == JobStatus.COMPLETE
+
+
+def test_wait_until_wakes_on_update_from_another_thread():
+    repo = InMemoryJobRepository()
+    repo.create("job", "url")
+    timer = threading.Timer(0.05, repo.set_result, ("job", object()))
+
+    async def wait():
+        timer.start()
+        started = time.monotonic()
+        await repo.wait_until("job", is_complete, timeout=5.0)
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(wait())
+
+    assert repo.get("job").status == JobStatus.COMPLETE
+    assert elapsed < 1.0
+
+
+def test_wait_until_ignores_updates_that_do_not_satisfy_predicate():
+    repo = InMemoryJobRepository()
+    repo.create("job", "url")
+
+    async def wait():
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.02, repo.update_status, "job", JobStatus.DOWNLOADING, 0.1)
+        loop.call_later(0.05, repo.update_status, "job", JobStatus.COMPLETE, 1.0)
+        await repo.wait_until("job", is_complete, timeout=5.0)
+
+    asyncio.run(wait())
+
+    assert repo.get("job").status == JobStatus.COMPLETE
+
+
+def test_wait_until_returns_after_timeout():
+    repo = InMemoryJobRepository()
+    repo.create("job", "url")
+
+    async def wait():
+        started = time.monotonic()
+        await repo.wait_until("job", is_complete, timeout=0.1)
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(wait())
+
+    assert 0.1 <= elapsed < 1.0
+    assert repo._waiters == {}
+
+
+def test_wait_until_returns_at_once_for_unknown_job():
+    repo = InMemoryJobRepository()
+
+    asyncio.run(asyncio.wait_for(repo.wait_until("missing", is_complete, 5.0), 1.0))
+
+
+def test_remove_keeps_cache_key_claimed_by_another_job():
+    repo = InMemoryJobRepository()
+    repo.create("old", "url")
+    repo.set_cache("video:auto", "new")
+
+    repo.remove("old", "video:auto")
+
+    assert repo.get("old") is None
+    assert repo.get_cached_job_id("video:auto") == "new"
+
+
+def test_remove_clears_its_own_cache_key():
+    repo = InMemoryJobRepository()
+    repo.create("job", "url")
+    repo.set_cache("video:auto", "job")
+
+    repo.remove("job", "video:auto")
+
+    assert repo.get_cached_job_id("video:auto") is None
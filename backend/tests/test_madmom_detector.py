@@ -0,0 +1,94 @@
+import random
+
+import numpy as np
+import pytest
+
+from app.beat_detection.madmom_detector import MadmomBeatDetector
+
+
+def reference_assembly(beat_times, downbeat_result):
+    """The per-beat loops _detect_signal replaced, from the tracker outputs on."""
+    if downbeat_result is None:
+        downbeat_times = beat_times
+        beat_positions = np.array([(i % 4) + 1 for i in range(len(beat_times))])
+    else:
+        downbeat_times = downbeat_result[:, 0]
+        beat_positions = downbeat_result[:, 1].astype(int)
+
+    if len(beat_times) >= 2:
+        median_ibi = float(np.median(np.diff(beat_times)))
+        tempo = 60.0 / median_ibi if median_ibi > 0 else 120.0
+    else:
+        tempo = 120.0
+
+    beats_raw = [
+        {"time": float(t), "beat_num": int(pos)}
+        for t, pos in zip(downbeat_times, beat_positions)
+    ]
+
+    eight_count_beats = []
+    bar_cycle = 0
+    for b in beats_raw:
+        num = b["beat_num"]
+        if num == 1:
+            bar_cycle += 1
+        adjusted = num if (bar_cycle % 2 == 1) else num + 4
+        eight_count_beats.append((b["time"], adjusted))
+
+    bars = []
+    bar_start = None
+    bar_num = 0
+    for b in beats_raw:
+        if b["beat_num"] == 1:
+            if bar_start is not None:
+                bars.append((bar_start, b["time"], bar_num))
+            bar_num += 1
+            bar_start = b["time"]
+    if bar_start is not None and len(beats_raw) > 0:
+        bars.append((bar_start, beats_raw[-1]["time"], bar_num))
+
+    return eight_count_beats, bars, tempo
+
+
+def failing_tracker(activations):
+    raise ValueError("no downbeats found")
+
+
+def make_detector(beat_times, downbeat_result):
+    """A detector whose madmom processors are replaced by canned outputs."""
+    detector = MadmomBeatDetector()
+    detector.__dict__.update(
+        _beat_rnn=lambda signal: signal,
+        _downbeat_rnn=lambda signal: signal,
+        _beat_dbn=lambda activations: beat_times,
+        _downbeat_dbn=(
+            failing_tracker if downbeat_result is None else lambda activations: downbeat_result
+        ),
+    )
+    return detector
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_detect_signal_matches_reference(seed):
+    rng = random.Random(seed)
+    n = rng.choice([0, 1, 2, rng.randint(3, 40)])
+    beat_times = np.cumsum([rng.uniform(0.3, 0.7) for _ in range(n)])
+    if rng.random() < 0.2:
+        downbeat_result = None
+    else:
+        # Mostly regular bars, with dropped beats and bars that start late
+        start = rng.randint(1, 4)
+        positions = [(start + i - 1) % 4 + 1 for i in range(n)]
+        positions = [p if rng.random() > 0.1 else rng.randint(1, 4) for p in positions]
+        downbeat_result = np.column_stack([beat_times, positions])
+
+    detector = make_detector(beat_times, downbeat_result)
+    try:
+        result = detector._detect_signal(object())
+    finally:
+        detector.close()
+
+    beats, bars, tempo = reference_assembly(beat_times, downbeat_result)
+    assert [(b.time, b.beat_num) for b in result.beats] == beats
+    assert [(b.start, b.end, b.bar_num) for b in result.bars] == bars
+    assert result.tempo == tempo
@@ -0,0 +1,112 @@
+import copy
+import random
+
+import pytest
+
+from app.instrument_analysis.pattern_smoother import (
+    DEVIATION_THRESHOLD,
+    SECTION_BREAK_THRESHOLD,
+    SMOOTH_WINDOW_MIN_SECTION,
+    PatternSmoother,
+)
+from app.instrument_analysis.subdivision_grid import NUM_SUBDIVISIONS
+
+
+def _jaccard(a, b):
+    set_a = {i for i, v in enumerate(a) if v}
+    set_b = {i for i, v in enumerate(b) if v}
+    if not set_a and not set_b:
+        return 1.0
+    return len(set_a & set_b) / len(set_a | set_b)
+
+
+def reference_smooth(result_bars):
+    """The per-instrument dict smoothing the array version replaced."""
+    if len(result_bars) < SMOOTH_WINDOW_MIN_SECTION:
+        return result_bars
+
+    names = {inst["instrument"] for bar in result_bars for inst in bar["instruments"]}
+    for name in names:
+        rows = [
+            next((i for i in bar["instruments"] if i["instrument"] == name), None)
+            for bar in result_bars
+        ]
+        patterns = [
+            None if row is None
+            else [cell["active"] if isinstance(cell, dict) else cell for cell in row["beats"]]
+            for row in rows
+        ]
+
+        sections, current = [], [0]
+        for i in range(1, len(patterns)):
+            prev, curr = patterns[i - 1], patterns[i]
+            if prev is None or curr is None or _jaccard(prev, curr) < SECTION_BREAK_THRESHOLD:
+                sections.append(current)
+                current = [i]
+            else:
+                current.append(i)
+        sections.append(current)
+
+        for section in sections:
+            members = [patterns[i] for i in section if patterns[i] is not None]
+            if len(section) < SMOOTH_WINDOW_MIN_SECTION or len(members) < SMOOTH_WINDOW_MIN_SECTION:
+                continue
+            consensus = [
+                sum(1 for p in members if p[s]) >= len(members) / 2
+                for s in range(NUM_SUBDIVISIONS)
+            ]
+            for i in section:
+                if sum(a != b for a, b in zip(patterns[i], consensus)) <= DEVIATION_THRESHOLD:
+                    continue
+                for s in range(NUM_SUBDIVISIONS):
+                    hits = [
+                        rows[j]["beats"][s] for j in section
+                        if j != i and rows[j] is not None
+                        and isinstance(rows[j]["beats"][s], dict)
+                        and rows[j]["beats"][s].get("active")
+                    ]
+                    if consensus[s]:
+                        vel = sum(c.get("velocity", 0.7) for c in hits) / len(hits) if hits else 0.7
+                        pit = sum(c.get("pitch", 0.5) for c in hits) / len(hits) if hits else 0.5
+                        rows[i]["beats"][s] = {
+                            "active": True, "velocity": round(vel, 3), "pitch": round(pit, 3)
+                        }
+                    else:
+                        rows[i]["beats"][s] = {"active": False, "velocity": 0.0, "pitch": 0.5}
+    return result_bars
+
+
+def random_bars(rng):
+    names = ["a", "b", "c", "d"][:rng.randint(1, 4)]
+    proto = {n: [rng.random() < 0.4 for _ in range(NUM_SUBDIVISIONS)] for n in names}
+    bars = []
+    for bar_num in range(rng.randint(0, 30)):
+        instruments = []
+        for n in names:
+            if rng.random() < 0.08:
+                continue
+            if rng.random() < 0.1:
+                proto[n] = [rng.random() < 0.4 for _ in range(NUM_SUBDIVISIONS)]
+            noise = rng.choice([0.05, 0.3])
+            flags = [on ^ (rng.random() < noise) for on in proto[n]]
+            if rng.random() < 0.05:
+                beats = flags
+            else:
+                beats = [
+                    {"active": True, "velocity": round(rng.random(), 3), "pitch": round(rng.random(), 3)}
+                    if on else {"active": False, "velocity": 0.0, "pitch": 0.5}
+                    for on in flags
+                ]
+            instruments.append({"instrument": n, "beats": beats})
+        rng.shuffle(instruments)
+        bars.append({"bar_num": bar_num, "instruments": instruments})
+    return bars
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_smooth_matches_reference(seed):
+    bars = random_bars(random.Random(seed))
+
+    smoothed = PatternSmoother().smooth(copy.deepcopy(bars))
+
+    assert smoothed == reference_smooth(copy.deepcopy(bars))
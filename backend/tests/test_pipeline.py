@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from app.analysis.pipeline import AnalysisPipeline
+from app.beat_detection.models import BeatDetectionResult
+from app.jobs.in_memory_repository import InMemoryJobRepository
+from app.jobs.models import JobStatus
+from app.separator.models import SeparationResult
+
+
+class FakeSeparator:
+    """Writes one stem into the output directory, or fails after creating it."""
+
+    def __init__(self, fail=False, on_separate=None):
+        self.fail = fail
+        self.on_separate = on_separate
+
+    def separate(self, audio_path, output_dir=None):
+        stems_dir = os.path.join(output_dir, "htdemucs", "song")
+        os.makedirs(stems_dir)
+        if self.on_separate is not None:
+            self.on_separate()
+        if self.fail:
+            raise RuntimeError("demucs failed")
+        open(os.path.join(stems_dir, "drums.wav"), "wb").close()
+        return SeparationResult(stems_dir=stems_dir)
+
+
+class FakeBeatDetector:
+    def detect_from_array(self, y, sr):
+        return BeatDetectionResult(beats=[], bars=[], tempo=120.0)
+
+    def close(self):
+        pass
+
+
+class FakeInstrumentAnalyzer:
+    def analyze(self, genre, bars, beats, stems_dir, tempo):
+        return {"genre": genre, "instrument_list": [], "bars": []}
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def song(tmp_path):
+    path = tmp_path / "song.wav"
+    sf.write(path, np.zeros(2205, dtype=np.float32), 22050)
+    return path
+
+
+def run_job(repo, separator):
+    pipeline = AnalysisPipeline(
+        None, separator, FakeBeatDetector(), FakeInstrumentAnalyzer(), repo
+    )
+    try:
+        pipeline.run("job")
+    finally:
+        pipeline.close()
+    return repo.get("job")
+
+
+def make_repo(song):
+    repo = InMemoryJobRepository()
+    job = repo.create("job", "url")
+    job.video_id = "vid"
+    repo.set_audio_cache("vid", str(song), "title", 0.1)
+    return repo
+
+
+def stems_dirs(song):
+    return sorted(p for p in os.listdir(song.parent) if p.startswith("stems_"))
+
+
+def test_separated_stems_are_cached(song):
+    repo = make_repo(song)
+
+    job = run_job(repo, FakeSeparator())
+
+    assert job.status == JobStatus.COMPLETE
+    assert repo.get_stems_cache("vid") == job.stems_dir
+    assert os.path.isfile(os.path.join(job.stems_dir, "drums.wav"))
+
+
+def test_failed_separation_removes_its_directory(song):
+    repo = make_repo(song)
+
+    job = run_job(repo, FakeSeparator(fail=True))
+
+    assert job.status == JobStatus.COMPLETE
+    assert job.stems_dir is None
+    assert stems_dirs(song) == []
+
+
+def test_stems_cached_by_another_run_replace_this_runs_copy(song, tmp_path):
+    repo = make_repo(song)
+    other = tmp_path / "other_stems"
+    other.mkdir()
+
+    # Another genre of the song finishes while this one is separating
+    separator = FakeSeparator(on_separate=lambda: repo.set_stems_cache("vid", str(other)))
+    job = run_job(repo, separator)
+
+    assert job.stems_dir == str(other)
+    assert repo.get_stems_cache("vid") == str(other)
+    assert stems_dirs(song) == []
@@ -0,0 +1,168 @@
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+redis = pytest.importorskip("redis")
+
+from app.analysis.models import AnalysisResult, InstrumentGrid, Metadata
+from app.analysis.service import AnalysisService
+from app.genre.models import GenreHint
+from app.jobs import redis_repository
+from app.jobs.models import JobStatus
+from app.jobs.redis_repository import RedisJobRepository
+
+URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+CACHE_KEY = "dQw4w9WgXcQ:auto"
+
+
+@pytest.fixture
+def make_repo(monkeypatch):
+    """Build repositories that share one fake Redis server, like two workers."""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        redis.Redis, "from_url", lambda url, **kwargs: fakeredis.FakeRedis(server=server)
+    )
+    repos = []
+
+    def make():
+        repos.append(RedisJobRepository("redis://test"))
+        return repos[-1]
+
+    yield make
+    for repo in repos:
+        repo.close()
+
+
+def make_result():
+    return AnalysisResult(
+        metadata=Metadata(title="song", duration=1.0, genre_hint=GenreHint.SALSA),
+        tempo=120.0,
+        beats=[],
+        bars=[],
+        instrument_grid=InstrumentGrid(genre="salsa", instrument_list=[], bars=[]),
+    )
+
+
+def test_created_job_is_persisted_with_its_video_and_genre(make_repo):
+    repo = make_repo()
+    repo.create("job", "url", video_id="vid", genre=GenreHint.SALSA)
+
+    job = make_repo().get("job")
+
+    assert job.status == JobStatus.QUEUED
+    assert job.video_id == "vid"
+    assert job.genre == GenreHint.SALSA
+
+
+def test_finished_result_is_read_back_from_redis(make_repo):
+    repo = make_repo()
+    repo.create("job", "url")
+    repo.set_result("job", make_result())
+
+    assert "job" not in repo._jobs
+    assert repo._redis.get("lease:job") is None
+    job = make_repo().get("job")
+    assert job.status == JobStatus.COMPLETE
+    assert job.result == make_result()
+
+
+def test_only_recent_finished_jobs_stay_in_memory(make_repo):
+    repo = make_repo()
+    count = redis_repository.LOCAL_FINISHED_JOBS + 4
+    for i in range(count):
+        repo.create(f"job{i}", "url")
+        repo.set_result(f"job{i}", make_result())
+
+    assert repo._jobs == {}
+    assert len(repo._finished) == redis_repository.LOCAL_FINISHED_JOBS
+    assert "job0" not in repo._finished
+    assert repo.get("job0").status == JobStatus.COMPLETE
+
+
+def test_remove_keeps_cache_key_claimed_by_another_job(make_repo):
+    make_repo().set_cache("video:auto", "new")
+    repo = make_repo()
+
+    repo.remove("old", "video:auto")
+    assert repo.get_cached_job_id("video:auto") == "new"
+
+    repo.remove("new", "video:auto")
+    assert repo.get_cached_job_id("video:auto") is None
+
+
+def test_claim_cache_returns_the_existing_owner(make_repo):
+    assert make_repo().claim_cache("video:auto", "first") == "first"
+    assert make_repo().claim_cache("video:auto", "second") == "first"
+
+
+def test_claim_cache_retries_when_the_owner_expires_mid_claim(make_repo):
+    repo = make_repo()
+    repo._redis.set("cache:video:auto", "old")
+    client_get = repo._redis.get
+
+    def get_after_expiry(key):
+        # The owner's key expires between the failed SET NX and this read
+        repo._redis.delete(key)
+        repo._redis.get = client_get
+        return client_get(key)
+
+    repo._redis.get = get_after_expiry
+
+    assert repo.claim_cache("video:auto", "new") == "new"
+    assert make_repo().get_cached_job_id("video:auto") == "new"
+
+
+class IdlePipeline:
+    """Leaves jobs in flight; these tests only look at submission."""
+
+    def run(self, job_id):
+        pass
+
+
+def start_job(repo, job_id):
+    repo.create(job_id, URL, video_id="dQw4w9WgXcQ")
+    repo.claim_cache(CACHE_KEY, job_id)
+    repo.update_status(job_id, JobStatus.DOWNLOADING, 0.05)
+
+
+def submit(repo):
+    service = AnalysisService(IdlePipeline(), repo)
+    try:
+        return service.submit(URL)["job_id"]
+    finally:
+        service.close()
+
+
+def test_submit_shares_a_job_running_on_a_live_worker(make_repo):
+    start_job(make_repo(), "running")
+
+    assert submit(make_repo()) == "running"
+
+
+def test_submit_replaces_a_job_left_in_flight_by_a_dead_worker(make_repo):
+    crashed = make_repo()
+    start_job(crashed, "stuck")
+    # The worker dies mid-download: its heartbeat stops and the lease expires
+    crashed.close()
+    crashed._redis.delete("lease:stuck")
+
+    restarted = make_repo()
+    job_id = submit(restarted)
+
+    assert job_id != "stuck"
+    assert restarted.get("stuck") is None
+    assert restarted.get_cached_job_id(CACHE_KEY) == job_id
+
+
+def test_heartbeat_renews_leases_of_in_flight_jobs(make_repo, monkeypatch):
+    monkeypatch.setattr(redis_repository, "LEASE_RENEW_INTERVAL", 0.01)
+    repo = make_repo()
+    repo.create("job", URL)
+    repo._redis.delete("lease:job")
+
+    deadline = time.monotonic() + 2.0
+    while repo._redis.get("lease:job") is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert 0 < repo._redis.ttl("lease:job") <= redis_repository.LEASE_TTL_SECONDS
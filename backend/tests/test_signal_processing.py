@@ -0,0 +1,163 @@
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import librosa
+import numpy as np
+import pytest
+import soundfile as sf
+
+from app.genre.models import FREQ_BANDS
+from app.instrument_analysis import signal_processing
+from app.instrument_analysis.signal_processing import (
+    SNAP_TOLERANCE,
+    SPECTRAL_WINDOW_SEC,
+    load_stem,
+    load_stems,
+    onset_spectral_pitches,
+    snap_to_subdivisions,
+)
+
+
+def reference_snap(onset_time, subdiv_times, cycle_end):
+    """Per-onset linear scan the vectorized snapping replaced."""
+    best_idx = -1
+    best_dist = float("inf")
+    for i, st in enumerate(subdiv_times):
+        dist = abs(onset_time - st)
+        if dist < best_dist:
+            best_dist = dist
+            best_idx = i
+
+    if best_idx >= 0:
+        if best_idx + 1 < len(subdiv_times):
+            subdiv_dur = subdiv_times[best_idx + 1] - subdiv_times[best_idx]
+        else:
+            subdiv_dur = cycle_end - subdiv_times[best_idx]
+        if subdiv_dur > 0 and best_dist / subdiv_dur > SNAP_TOLERANCE:
+            return -1
+    return best_idx
+
+
+def reference_pitch(bp_signal, sr, onset_time, freq_band):
+    """Per-onset spectral centroid the batched pitch computation replaced."""
+    half_win = int(SPECTRAL_WINDOW_SEC * sr / 2)
+    center = int(onset_time * sr)
+    start = max(0, center - half_win)
+    end = min(len(bp_signal), center + half_win)
+    if end <= start:
+        return 0.5
+
+    window = bp_signal[start:end]
+    if np.max(np.abs(window)) < 1e-8:
+        return 0.5
+
+    centroid = librosa.feature.spectral_centroid(y=window, sr=sr, n_fft=min(len(window), 1024))
+    freq_low, freq_high = FREQ_BANDS[freq_band]
+    normalized = (float(np.mean(centroid)) - freq_low) / (freq_high - freq_low)
+    return max(0.0, min(1.0, normalized))
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_snap_to_subdivisions_matches_reference(seed):
+    rng = random.Random(seed)
+    # Coarse quarter-step times make ties and repeated grid times common
+    grid = sorted(rng.randint(0, 40) / 4 for _ in range(rng.randint(1, 16)))
+    cycle_end = grid[-1] + rng.choice([0.0, 0.5, 1.0])
+    onsets = [rng.randint(-4, 48) / 8 for _ in range(rng.randint(0, 30))]
+
+    snapped = snap_to_subdivisions(np.array(onsets), np.array(grid), cycle_end)
+
+    assert snapped.tolist() == [reference_snap(t, grid, cycle_end) for t in onsets]
+
+
+def test_snap_to_subdivisions_without_onsets():
+    assert snap_to_subdivisions(np.array([]), np.arange(16.0), 16.0).size == 0
+
+
+@pytest.mark.parametrize("freq_band", ["low", "mid", "high"])
+def test_onset_spectral_pitches_match_reference(freq_band):
+    sr = 22050
+    rng = np.random.default_rng(0)
+    signal = (0.1 * rng.standard_normal(sr * 3)).astype(np.float32)
+    signal[sr:sr + sr // 2] = 0.0  # a silent stretch
+    # Onsets clipped at either end, inside the silence, past the end and in between
+    onsets = np.concatenate([
+        [0.0, 0.005, 1.2, 2.999, 3.5],
+        rng.uniform(0, 3, 50),
+    ])
+
+    pitches = onset_spectral_pitches(signal, sr, onsets, freq_band)
+
+    expected = [reference_pitch(signal, sr, t, freq_band) for t in onsets]
+    np.testing.assert_allclose(pitches, expected, rtol=0, atol=1e-9)
+    assert pitches[2] == 0.5
+    assert pitches[4] == 0.5
+
+
+@pytest.mark.parametrize(
+    ("sr", "channels", "subtype"),
+    [(44100, 2, "PCM_16"), (22050, 1, "FLOAT"), (48000, 2, "PCM_24")],
+)
+def test_load_stem_matches_librosa_load(tmp_path, monkeypatch, sr, channels, subtype):
+    # Small blocks so the decode spans many of them and ends on a partial one
+    monkeypatch.setattr(signal_processing, "STEM_BLOCK_FRAMES", 1000)
+    rng = np.random.default_rng(sr)
+    path = tmp_path / "drums.wav"
+    sf.write(path, rng.uniform(-0.5, 0.5, (sr // 2 + 123, channels)), sr, subtype=subtype)
+
+    y, stem_sr = load_stem(path)
+    expected, expected_sr = librosa.load(str(path), sr=22050, mono=True)
+
+    assert stem_sr == expected_sr
+    assert y.dtype == np.float32
+    np.testing.assert_allclose(y, expected, atol=1e-6)
+
+
+@pytest.fixture
+def stem_cache():
+    signal_processing._load_stem_cached.cache_clear()
+    with ThreadPoolExecutor(2) as pool:
+        yield pool
+    signal_processing._load_stem_cached.cache_clear()
+
+
+def write_stem(path, seconds, value):
+    sf.write(path, np.full(int(22050 * seconds), value, dtype=np.float32), 22050, subtype="FLOAT")
+
+
+def test_load_stems_reuses_decoded_stems(tmp_path, stem_cache):
+    write_stem(tmp_path / "drums.wav", 0.5, 0.25)
+    write_stem(tmp_path / "bass.wav", 0.5, -0.25)
+
+    first = load_stems(str(tmp_path), stem_cache)
+    second = load_stems(str(tmp_path), stem_cache)
+
+    assert first.keys() == {"drums", "bass"}
+    for name, (y, _) in first.items():
+        assert second[name][0] is y
+        assert not y.flags.writeable
+        with pytest.raises(ValueError):
+            y[0] = 0.0
+
+
+def test_load_stems_decodes_again_when_a_stem_changes(tmp_path, stem_cache):
+    path = tmp_path / "drums.wav"
+    write_stem(path, 0.5, 0.25)
+    original = os.stat(path)
+    first, _ = load_stems(str(tmp_path), stem_cache)["drums"]
+
+    # Same size, newer mtime
+    write_stem(path, 0.5, 0.5)
+    os.utime(path, ns=(original.st_atime_ns, original.st_mtime_ns + 10**9))
+    second, _ = load_stems(str(tmp_path), stem_cache)["drums"]
+
+    # Different size, original mtime
+    write_stem(path, 0.75, -0.5)
+    os.utime(path, ns=(original.st_atime_ns, original.st_mtime_ns))
+    third, _ = load_stems(str(tmp_path), stem_cache)["drums"]
+
+    np.testing.assert_allclose(first, 0.25)
+    np.testing.assert_allclose(second, 0.5)
+    np.testing.assert_allclose(third, -0.5)
+    assert len(third) == int(22050 * 0.75)
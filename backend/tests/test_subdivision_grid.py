@@ -0,0 +1,75 @@
+import random
+
+import numpy as np
+import pytest
+
+from app.instrument_analysis.subdivision_grid import (
+    GRID_REGULARIZATION_ALPHA,
+    NUM_SUBDIVISIONS,
+    SubdivisionGridBuilder,
+)
+
+
+def reference_build_grid(cycle_start, cycle_end, beat_times, median_beat_period=None):
+    """The list-based grid construction the array version replaced."""
+    cycle_beats = [t for t in beat_times if cycle_start <= t < cycle_end]
+
+    if len(cycle_beats) < 2:
+        step = (cycle_end - cycle_start) / NUM_SUBDIVISIONS
+        return [cycle_start + i * step for i in range(NUM_SUBDIVISIONS)]
+
+    subdivs = []
+    for i, bt in enumerate(cycle_beats):
+        subdivs.append(bt)
+        if i + 1 < len(cycle_beats):
+            subdivs.append((bt + cycle_beats[i + 1]) / 2.0)
+        else:
+            subdivs.append(bt + (bt - cycle_beats[i - 1]) / 2.0)
+
+    if len(subdivs) < NUM_SUBDIVISIONS:
+        last = subdivs[-1]
+        remaining = NUM_SUBDIVISIONS - len(subdivs)
+        gap = (cycle_end - last) / (remaining + 1)
+        subdivs.extend(last + j * gap for j in range(1, remaining + 1))
+    subdivs = subdivs[:NUM_SUBDIVISIONS]
+
+    if median_beat_period is not None:
+        expected = []
+        for i in range(NUM_SUBDIVISIONS // 2):
+            beat_time = cycle_start + i * median_beat_period
+            expected += [beat_time, beat_time + median_beat_period / 2.0]
+        alpha = GRID_REGULARIZATION_ALPHA
+        subdivs = [alpha * local + (1 - alpha) * exp for local, exp in zip(subdivs, expected)]
+
+    return subdivs
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_build_grid_matches_reference(seed):
+    rng = random.Random(seed)
+    cycle_start = rng.uniform(0, 100)
+    cycle_end = cycle_start + rng.uniform(2, 6)
+    beat_times = sorted(
+        rng.uniform(cycle_start - 2, cycle_end + 2) for _ in range(rng.randint(0, 14))
+    )
+    median = rng.choice([None, rng.uniform(0.3, 0.8)])
+
+    grid = SubdivisionGridBuilder().build_grid(
+        cycle_start, cycle_end, np.array(beat_times), median
+    )
+
+    assert grid.shape == (NUM_SUBDIVISIONS,)
+    np.testing.assert_allclose(
+        grid,
+        reference_build_grid(cycle_start, cycle_end, beat_times, median),
+        rtol=0,
+        atol=1e-12,
+    )
+
+
+def test_pair_bars_into_cycles_keeps_trailing_bar():
+    bars = [{"start": float(i), "end": float(i + 1)} for i in range(5)]
+
+    cycles = SubdivisionGridBuilder().pair_bars_into_cycles(bars)
+
+    assert cycles == [(0.0, 2.0), (2.0, 4.0), (4.0, 5.0)]